@@ -1,28 +1,202 @@
+import os
+import re
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from pymongo import MongoClient
+from pymongo import DeleteMany, InsertOne, UpdateMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
+from textpatch import PatchError, apply_edits, apply_unified_diff
+from filestore import (MONGO_URI, DB_NAME, COLLECTION_NAME, bootstrap, collection_stats, connect,
+                       current_revision, record_deletions, revision, run_in_transaction,
+                       subtree, tombstones, utcnow)
 
 app = Flask(__name__)
 CORS(app)
 
-# MongoDB Atlas connection details
-MONGO_URI = ""
-DB_NAME = "DataStorage"
-COLLECTION_NAME = "collections"
-
-client = MongoClient(MONGO_URI)
+# MongoDB Atlas connection details (MONGO_URI; mongomock:// for a local in-memory stand-in)
+client = connect(MONGO_URI)
 db = client[DB_NAME]
 files_collection = db[COLLECTION_NAME]
 
+try:
+    bootstrap(files_collection)
+except PyMongoError as e:
+    print(f"Skipping collection bootstrap: {e}")
+
+
+# Most changes returned by one GET /files/changes call
+CHANGES_PAGE_SIZE = 1000
+# Most operations accepted by one POST /files/bulk call
+BULK_MAX_OPS = 1000
+
+
+def name_taken(name):
+    return jsonify({'error': f"An item named '{name}' already exists in this folder"}), 409
+
+
+def stale_revision(base_rev, current_rev):
+    return jsonify({'error': f'File changed since revision {base_rev}', 'rev': current_rev}), 409
+
+
+def not_modified(revision):
+    """304 when the client already holds this revision of the tree"""
+    if str(revision) in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(str(revision))
+        return response
+    return None
+
+
+def versioned(payload, revision):
+    response = jsonify(payload)
+    response.set_etag(str(revision))
+    response.headers['X-Files-Revision'] = str(revision)
+    # Browsers revalidate with If-None-Match on every fetch and reuse the body on 304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 
 @app.route('/files', methods=['GET'])
 def get_file_system():
     """Fetches the entire file system structure."""
+    # Read the revision first: everything up to it has landed, and newer
+    # writes caught by the query only mean the next ETag will not match
+    tree_rev = current_revision(db)
+    cached = not_modified(tree_rev)
+    if cached:
+        return cached
     files = list(files_collection.find({}))
     for file in files:
         file['_id'] = str(file['_id'])
-    return jsonify(files)
+    return versioned(files, tree_rev)
+
+# Everything the sidebar needs to draw a node; file content is fetched on open
+TREE_PROJECTION = {'content': 0}
+
+
+def tree_node(doc):
+    node = dict(doc, _id=str(doc['_id']))
+    if node.get('type') == 'folder':
+        node['children'] = []
+    return node
+
+
+def build_tree(docs):
+    """Nest content-free documents under their parent_id in a single pass.
+
+    Items whose parent is missing (deleted or never existed) are returned as
+    roots so they stay reachable.
+    """
+    nodes = {}
+    order = []
+    for doc in docs:
+        node = tree_node(doc)
+        nodes[node['_id']] = node
+        order.append(node)
+
+    roots = []
+    for node in order:
+        parent = nodes.get(node.get('parent_id'))
+        if parent is not None and 'children' in parent:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+    return roots
+
+
+@app.route('/files/tree', methods=['GET'])
+def get_file_tree():
+    """Returns the nested file tree without file contents.
+
+    With ?parent_id=<id> only that folder's direct children are returned
+    (use "root" for the top level), each folder flagged with has_children,
+    so the sidebar can load a large tree one folder at a time.
+    Responses carry the tree revision as ETag and honour If-None-Match.
+    """
+    tree_rev = current_revision(db)
+    cached = not_modified(tree_rev)
+    if cached:
+        return cached
+
+    if 'parent_id' not in request.args:
+        return versioned(build_tree(files_collection.find({}, TREE_PROJECTION)), tree_rev)
+
+    parent_id = request.args['parent_id']
+    query = {'parent_id': None} if parent_id in ('', 'root') else {'parent_id': parent_id}
+    children = [tree_node(doc) for doc in files_collection.find(query, TREE_PROJECTION)]
+    folder_ids = [child['_id'] for child in children if child.get('type') == 'folder']
+    non_empty = set(files_collection.distinct('parent_id', {'parent_id': {'$in': folder_ids}})) if folder_ids else set()
+    for child in children:
+        if 'children' in child:
+            child['has_children'] = child['_id'] in non_empty
+    return versioned(children, tree_rev)
+
+
+def changes_since(since, until, limit):
+    """Changed documents and deleted ids in revisions since+1..until, in revision order.
+
+    Returns (changed, deleted, revision, more). A page never ends in the
+    middle of a revision, so `revision` is always a safe cursor for the
+    next call.
+    """
+    window = {'rev': {'$gt': since, '$lte': until}}
+    changed = list(files_collection.find(window, TREE_PROJECTION).sort('rev', 1).limit(limit + 1))
+    deleted = list(tombstones(files_collection).find(window).sort('rev', 1).limit(limit + 1))
+    events = sorted([(doc['rev'], 'changed', doc) for doc in changed] +
+                    [(doc['rev'], 'deleted', doc) for doc in deleted], key=lambda event: event[0])
+    if len(events) <= limit:
+        more = False
+        revision = None
+    else:
+        more = True
+        cut = events[limit][0]
+        events = [event for event in events if event[0] < cut]
+        revision = events[-1][0] if events else cut
+        if not events:
+            # One revision touched more than a page of items; send all of it
+            events = ([(cut, 'changed', doc) for doc in files_collection.find({'rev': cut}, TREE_PROJECTION)] +
+                      [(cut, 'deleted', doc) for doc in tombstones(files_collection).find({'rev': cut})])
+    return ([tree_node(doc) for _, kind, doc in events if kind == 'changed'],
+            [doc['file_id'] for _, kind, doc in events if kind == 'deleted'],
+            revision, more)
+
+
+@app.route('/files/changes', methods=['GET'])
+def get_changes():
+    """Items created, updated or deleted after revision ?since=<rev>"""
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'error': 'since=<revision> is required'}), 400
+    limit = min(request.args.get('limit', CHANGES_PAGE_SIZE, type=int), CHANGES_PAGE_SIZE)
+
+    latest = current_revision(db)
+    if since >= latest:
+        return versioned({'revision': latest, 'changed': [], 'deleted': [], 'more': False}, latest)
+    changed, deleted, cursor, more = changes_since(since, latest, max(limit, 1))
+    cursor = cursor if more else latest
+    return jsonify({'revision': cursor, 'changed': changed, 'deleted': deleted, 'more': more})
+
+@app.route('/files/_stats', methods=['GET'])
+def get_stats():
+    """Collection size and index usage"""
+    return jsonify(collection_stats(db, files_collection)), 200
+
+def new_item(name, item_type, parent_id, rev):
+    item = {
+        'name': name,
+        'type': item_type,
+        'parent_id': parent_id,
+        'content': '',
+        'isOpen': False if item_type == 'folder' else None,
+        'updated_at': utcnow(),
+        'rev': rev
+    }
+    
+    if item_type == 'folder':
+        item['children'] = []
+    return item
 
 @app.route('/files', methods=['POST'])
 def create_file():
@@ -35,18 +209,12 @@ def create_file():
     if not name or not item_type:
         return jsonify({'error': 'Name and type are required.'}), 400
     
-    new_file = {
-        'name': name,
-        'type': item_type,
-        'parent_id': parent_id,
-        'content': '',
-        'isOpen': False if item_type == 'folder' else None
-    }
-    
-    if item_type == 'folder':
-        new_file['children'] = []
-
-    inserted_file = files_collection.insert_one(new_file)
+    with revision(db) as rev:
+        new_file = new_item(name, item_type, parent_id, rev)
+        try:
+            inserted_file = files_collection.insert_one(new_file)
+        except DuplicateKeyError:
+            return name_taken(name)
 
     new_file['_id'] = str(inserted_file.inserted_id)
 
@@ -55,10 +223,41 @@ def create_file():
 
 @app.route('/files/<file_id>', methods=['PUT'])
 def update_file(file_id):
-    """Renames a file or folder or stores the content."""
+    """Renames a file or folder or stores the content.
+
+    Content is sent whole ("content") or as a patch against the revision the
+    client last saved: "baseRev" plus "edits" or a unified "diff" (see
+    textpatch). Whenever "baseRev" is given the write only succeeds if the
+    item is still at that revision; otherwise 409 reports the current one.
+    """
     data = request.get_json()
     new_name = data.get('newName')
     content = data.get('content')
+    base_rev = data.get('baseRev')
+    is_patch = 'edits' in data or 'diff' in data
+
+    if is_patch and content is not None:
+        return jsonify({'error': 'Send either content or a patch, not both'}), 400
+    if is_patch and base_rev is None:
+        return jsonify({'error': 'baseRev is required to apply a patch'}), 400
+
+    query = {'_id': ObjectId(file_id)}
+    if base_rev is not None:
+        query['rev'] = base_rev
+
+    if is_patch:
+        current = files_collection.find_one({'_id': ObjectId(file_id)}, {'content': 1, 'rev': 1})
+        if current is None:
+            return jsonify({'error': 'File not found'}), 404
+        if current.get('rev') != base_rev:
+            return stale_revision(base_rev, current.get('rev'))
+        try:
+            if 'edits' in data:
+                content = apply_edits(current.get('content') or '', data['edits'])
+            else:
+                content = apply_unified_diff(current.get('content') or '', data['diff'])
+        except PatchError as e:
+            return jsonify({'error': f'Invalid patch: {e}'}), 400
     
     update_data = {}
 
@@ -71,12 +270,23 @@ def update_file(file_id):
     if not update_data:
         return jsonify({'error': 'New name or Content required for update'}), 400
     
-    result = files_collection.update_one({'_id': ObjectId(file_id)}, {'$set': update_data})
+    update_data['updated_at'] = utcnow()
+    with revision(db) as rev:
+        update_data['rev'] = rev
+        try:
+            result = files_collection.update_one(query, {'$set': update_data})
+        except DuplicateKeyError:
+            return name_taken(new_name)
 
-    if result.modified_count == 0:
+    if result.matched_count == 0:
+        if base_rev is not None:
+            current = files_collection.find_one({'_id': ObjectId(file_id)}, {'rev': 1})
+            if current is not None:
+                # Someone else saved between our read and this write
+                return stale_revision(base_rev, current.get('rev'))
         return jsonify({'error': 'File not found'}), 404
 
-    return jsonify({'message': 'File updated successfully'}), 200
+    return jsonify({'message': 'File updated successfully', 'rev': update_data['rev']}), 200
 
 
 @app.route('/files/<file_id>', methods=['GET'])
@@ -93,11 +303,229 @@ def get_file_content(file_id):
 
 @app.route('/files/<file_id>', methods=['DELETE'])
 def delete_file(file_id):
-    """Deletes a file or folder."""
-    result = files_collection.delete_one({'_id': ObjectId(file_id)})
-    if result.deleted_count == 0:
+    """Deletes a file, or a folder together with everything inside it."""
+    def delete(session):
+        ids = [doc['_id'] for doc in subtree(files_collection, [ObjectId(file_id)], {'type': 1}, session=session)]
+        if ids:
+            files_collection.delete_many({'_id': {'$in': ids}}, session=session)
+            record_deletions(files_collection, ids, rev, session=session)
+        return len(ids)
+
+    # The revision must outlive the transaction so readers only see it once committed
+    with revision(db) as rev:
+        deleted = run_in_transaction(client, delete)
+    if deleted == 0:
         return jsonify({'error': 'File not found'}), 404
-    return jsonify({'message': 'File deleted successfully'}), 200
+    return jsonify({'message': 'File deleted successfully', 'deleted': deleted}), 200
+
+
+def free_copy_name(parent_id, name, item_type):
+    """name if it is free in parent_id, else "name (copy)", "name (copy 2)", ...
+
+    Files keep their extension last: "main (copy).py".
+    """
+    stem, ext = os.path.splitext(name) if item_type != 'folder' else (name, '')
+    pattern = '^' + re.escape(stem)
+    taken = {doc['name'] for doc in files_collection.find({'parent_id': parent_id, 'name': {'$regex': pattern}}, {'name': 1})}
+    if name not in taken:
+        return name
+    candidate = f"{stem} (copy){ext}"
+    number = 2
+    while candidate in taken:
+        candidate = f"{stem} (copy {number}){ext}"
+        number += 1
+    return candidate
+
+
+@app.route('/files/<file_id>/copy', methods=['POST'])
+def copy_file(file_id):
+    """Copies a file or a whole folder into parent_id (default: the same folder).
+
+    Without a name the copy keeps the original's, or "<name> (copy)" when
+    that is taken in the target folder.
+    """
+    data = request.get_json(silent=True) or {}
+    docs = subtree(files_collection, [ObjectId(file_id)])
+    if not docs:
+        return jsonify({'error': 'File not found'}), 404
+
+    root = docs[0]
+    target = data.get('parent_id', root.get('parent_id'))
+    if 'parent_id' in data and target is not None:
+        try:
+            folder = files_collection.find_one({'_id': ObjectId(target)}, {'type': 1})
+        except (InvalidId, TypeError):
+            return jsonify({'error': f'Invalid parent_id {target!r}'}), 400
+        if folder is None:
+            return jsonify({'error': 'Target folder not found'}), 404
+        if folder.get('type') != 'folder':
+            return jsonify({'error': 'Target is not a folder'}), 400
+    name = data.get('name') or free_copy_name(target, root['name'], root.get('type'))
+
+    now = utcnow()
+    new_ids = {str(doc['_id']): ObjectId() for doc in docs}
+    with revision(db) as rev:
+        copies = []
+        for doc in docs:
+            copy = dict(doc, _id=new_ids[str(doc['_id'])], rev=rev, updated_at=now)
+            if doc is root:
+                copy['parent_id'] = target
+                copy['name'] = name
+            else:
+                copy['parent_id'] = str(new_ids[doc['parent_id']])
+            copies.append(copy)
+
+        try:
+            run_in_transaction(client, lambda session: files_collection.insert_many(copies, session=session))
+        except BulkWriteError:
+            # The copy is inserted root first, so a name collision inserts nothing
+            return name_taken(copies[0]['name'])
+    return jsonify({'_id': str(copies[0]['_id']), 'copied': len(copies), 'rev': rev}), 201
+
+
+class BulkOpError(ValueError):
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+def plan_bulk(ops, rev):
+    """Turn bulk ops into bulk_write requests.
+
+    Returns (requests, op index of each request, created ids by ref,
+    deletions as (request position, ids) pairs). A create may carry a "ref";
+    later ops can name it with parent_ref (create, move) or ref (rename,
+    move, delete) instead of an id. Creates without a ref are listed under
+    their op index. Deletes and move checks see the tree as the earlier ops
+    in the batch leave it.
+    """
+    requests, owners, created, deleted = [], [], {}, []
+    # Items created or moved earlier in the batch, by id: their parent id from then on
+    placed = {}
+    removed = set()
+
+    def resolve(index, op, id_key, ref_key):
+        if ref_key in op:
+            if op[ref_key] not in created:
+                raise BulkOpError(index, f"Unknown ref {op[ref_key]!r}")
+            item_id = created[op[ref_key]]
+        elif op.get(id_key) is None:
+            return None
+        else:
+            try:
+                item_id = ObjectId(op[id_key])
+            except (InvalidId, TypeError):
+                raise BulkOpError(index, f"Invalid {id_key} {op[id_key]!r}") from None
+        if str(item_id) in removed:
+            raise BulkOpError(index, f"{item_id} is deleted earlier in this batch")
+        return item_id
+
+    def descendants(target):
+        """target and everything below it, breadth first"""
+        ids, seen = [target], {str(target)}
+        frontier = [str(target)]
+        while frontier:
+            level = [doc['_id'] for doc in files_collection.find({'parent_id': {'$in': frontier}}, {'_id': 1})
+                     if str(doc['_id']) not in placed]
+            level += [ObjectId(item_id) for item_id, parent in placed.items() if parent in frontier]
+            level = [item for item in level if str(item) not in seen and str(item) not in removed]
+            seen.update(str(item) for item in level)
+            ids.extend(level)
+            frontier = [str(item) for item in level]
+        return ids
+
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise BulkOpError(index, "Each op must be an object")
+        kind = op.get('op')
+        if kind == 'create':
+            if not op.get('name') or not op.get('type'):
+                raise BulkOpError(index, 'Name and type are required.')
+            parent = resolve(index, op, 'parent_id', 'parent_ref')
+            item = new_item(op['name'], op['type'], str(parent) if parent else None, rev)
+            item['_id'] = ObjectId()
+            if op.get('content'):
+                item['content'] = op['content']
+            created[op.get('ref', str(index))] = item['_id']
+            placed[str(item['_id'])] = item['parent_id']
+            requests.append(InsertOne(item))
+        elif kind in ('rename', 'move', 'delete'):
+            target = resolve(index, op, 'id', 'ref')
+            if target is None:
+                raise BulkOpError(index, f"{kind} needs an id or ref")
+            if kind == 'delete':
+                ids = descendants(target)
+                removed.update(str(item) for item in ids)
+                deleted.append((len(requests), ids))
+                requests.append(DeleteMany({'_id': {'$in': ids}}))
+            else:
+                update = {'updated_at': utcnow(), 'rev': rev}
+                if kind == 'rename':
+                    if not op.get('newName'):
+                        raise BulkOpError(index, 'newName is required')
+                    update['name'] = op['newName']
+                else:
+                    parent = resolve(index, op, 'parent_id', 'parent_ref')
+                    if parent is not None and parent in descendants(target):
+                        raise BulkOpError(index, 'A folder cannot be moved into itself')
+                    update['parent_id'] = str(parent) if parent else None
+                    placed[str(target)] = update['parent_id']
+                # Filtering on _id matches at most one item; unlike UpdateOne, UpdateMany
+                # passes no sort option, which mongomock's bulk builder rejects
+                requests.append(UpdateMany({'_id': target}, {'$set': update}))
+        else:
+            raise BulkOpError(index, f"Unknown op {kind!r}, expected create, rename, move or delete")
+        owners.append(index)
+    return requests, owners, created, deleted
+
+
+@app.route('/files/bulk', methods=['POST'])
+def bulk_files():
+    """Applies a batch of create/rename/move/delete ops in one ordered bulk write.
+
+    Deletes are recursive. Where the server supports transactions the whole
+    batch is atomic; elsewhere ops before a failing one stay applied.
+    """
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'ops must be a non-empty list'}), 400
+    if len(ops) > BULK_MAX_OPS:
+        return jsonify({'error': f'At most {BULK_MAX_OPS} ops per request'}), 400
+
+    with revision(db) as rev:
+        try:
+            requests, owners, created, deleted = plan_bulk(ops, rev)
+        except BulkOpError as e:
+            return jsonify({'error': str(e), 'op': e.index}), 400
+
+        def apply(session):
+            try:
+                result = files_collection.bulk_write(requests, ordered=True, session=session)
+            except BulkWriteError as e:
+                if session is None:
+                    # Nothing rolls back without a transaction: the deletes before the failing op happened
+                    failed_at = e.details['writeErrors'][0]['index']
+                    record_deletions(files_collection,
+                                     [item for position, ids in deleted if position < failed_at for item in ids], rev)
+                raise
+            record_deletions(files_collection, [item for _, ids in deleted for item in ids], rev, session=session)
+            return result
+
+        try:
+            result = run_in_transaction(client, apply)
+        except BulkWriteError as e:
+            error = e.details['writeErrors'][0]
+            status = 409 if error.get('code') == 11000 else 400
+            return jsonify({'error': error.get('errmsg', 'Bulk write failed'), 'op': owners[error['index']]}), status
+
+    return jsonify({
+        'rev': rev,
+        'created': {ref: str(item_id) for ref, item_id in created.items()},
+        'inserted': result.inserted_count,
+        'modified': result.modified_count,
+        'deleted': result.deleted_count
+    }), 200
 
 
 if __name__ == '__main__':
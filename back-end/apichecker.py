@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 from flask_cors import CORS
 import requests
+import json
 import time
-import psutil
-from collections import deque
-from prometheus_client import Counter
-from flask_limiter import Limiter
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from assertions import AssertionSpecError, ResponseView, compile_assertions
+from httpclient import PooledClient
+from loadtest import JobRegistry, parse_headers, parse_load_options, run_load_test, sync_options
+from metrics import (SlidingWindowRate, error_counter, in_flight_requests, observe_upstream,
+                     request_counter, running_load_tests, sample_value)
+from runner import DEFAULT_CONCURRENCY as COLLECTION_CONCURRENCY, MAX_CONCURRENCY as COLLECTION_MAX_CONCURRENCY
+from runner import parse_specs, run_collection
+from ratelimit import RateLimiter
+from sampler import SystemSampler
+from streaming import (CHUNK_SIZE, TRUNCATION_MARKER, body_limit, decode_body, passthrough_headers,
+                       read_limited)
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -13,21 +22,39 @@ CORS(app, resources={
         "origins": ["http://localhost:3000"],
         "methods": ["POST"],
         "allow_headers": ["Content-Type"]
+    },
+    r"/run_collection": {
+        "origins": ["http://localhost:3000"],
+        "methods": ["POST"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/system_metrics": {
+        "origins": ["http://localhost:3000"],
+        "methods": ["GET"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/load_test.*": {
+        "origins": ["http://localhost:3000"],
+        "methods": ["GET", "POST", "DELETE"],
+        "allow_headers": ["Content-Type"]
     }
 })
 
-# Rate Limiting Setup
-limiter = Limiter(key_func=lambda: request.remote_addr)
-limiter.init_app(app)
+# Rate Limiting Setup (storage shared between workers via RATE_LIMIT_STORAGE)
+limiter = RateLimiter(key_func=lambda: request.remote_addr)
 
-# Throughput Tracking
-request_times = deque(maxlen=100)
+# Shared keep-alive client for outbound calls
+http_client = PooledClient()
+
+# Background load test runs
+load_jobs = JobRegistry()
+running_load_tests.set_function(load_jobs.running_count)
 
-# Total Requests Counter
-request_counter = Counter('flask_requests_total', 'Total requests received')
+# Host metrics sampled off the request path
+system_sampler = SystemSampler().start()
 
-# Error Counter
-error_counter = Counter('flask_errors_total', 'Total failed requests')
+# Throughput Tracking
+request_rate = SlidingWindowRate()
 
 @app.route('/test_api', methods=['POST'])
 @limiter.limit("10 per minute")  # Rate limit: 10 requests per minute per IP
@@ -35,9 +62,11 @@ def test_api():
     if not request.is_json:
         return jsonify({"error": "Content-Type must be application/json"}), 415
     
+    api_method = api_url = None
     try:
+        in_flight_requests.inc()
         g.start_time = time.time()
-        request_times.append(time.time())
+        request_rate.hit()
         request_counter.inc()
         request_size = request.content_length or 0
         
@@ -52,43 +81,242 @@ def test_api():
         if not api_url:
             return jsonify({"error": "API URL is required"}), 400
 
-        response = requests.request(
+        try:
+            assertions = compile_assertions(data.get('apiAssertions'))
+        except AssertionSpecError as e:
+            return jsonify({"error": f"Invalid assertions: {str(e)}"}), 400
+        try:
+            max_body_size = body_limit(data.get('apiMaxBodySize'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = http_client.request(
             method=api_method,
             url=api_url,
             headers=api_headers,
-            json=api_body if api_body else None
+            json=api_body if api_body else None,
+            stream=True
         )
+        time_to_first_byte = time.time() - g.start_time
+
+        if data.get('apiStream'):
+            return stream_upstream(response, api_url, api_method, max_body_size, time_to_first_byte)
+
+        try:
+            body, truncated = read_limited(response.iter_content(CHUNK_SIZE), max_body_size)
+        finally:
+            response.close()
 
         latency = time.time() - g.start_time
-        cpu_usage = psutil.cpu_percent()
-        memory_usage = psutil.virtual_memory().percent
-        now = time.time()
-        one_second_ago = now - 1
-        throughput = sum(1 for t in request_times if t > one_second_ago)
+        observe_upstream(api_url, api_method, response.status_code, latency)
+        system = system_sampler.latest()
+        throughput = request_rate.rate()
 
         response_data = {
             "status_code": response.status_code,
             "headers": dict(response.headers),
-            "data": None if response.status_code == 204 else response.json() if response.headers.get("Content-Type", "").startswith("application/json") else response.text,
+            "data": decode_body(response.status_code, response.headers, body, truncated,
+                                max_body_size, response.encoding),
+            "truncated": truncated,
             "metrics": {
                 "response_time": latency,
+                "time_to_first_byte": time_to_first_byte,
                 "request_size": request_size,
-                "cpu_usage": cpu_usage,
-                "memory_usage": memory_usage,
+                "response_size": len(body),
+                "cpu_usage": system["cpu_usage"],
+                "memory_usage": system["memory_usage"],
+                "process_rss": system["process_rss"],
                 "requests_per_second": throughput,
-                "total_requests": request_counter._value.get(),
-                "error_count": error_counter._value.get()
+                "total_requests": sample_value('flask_requests_total'),
+                "error_count": sample_value('flask_errors_total'),
+                "connection_pool": http_client.metrics()
             }
         }
 
+        if assertions:
+            response_data["assertions"] = assertions.evaluate(ResponseView(
+                response.status_code, response.headers, body, latency))
+
         return jsonify(response_data)
 
     except requests.exceptions.RequestException as e:
         error_counter.inc()
+        observe_upstream(api_url, api_method, None, time.time() - g.start_time)
         return jsonify({"error": f"Request failed: {str(e)}"}), 500
     except Exception as e:
         error_counter.inc()
         return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        in_flight_requests.dec()
+
+def stream_upstream(response, api_url, api_method, max_body_size, time_to_first_byte):
+    """Relay the upstream body as a chunked stream without buffering or parsing it.
+
+    Upstream status and headers are passed through; proxy metrics travel in
+    X-Upstream-* headers because the body is the target's own bytes. A body
+    over max_body_size is cut there and ends with the truncation marker.
+    """
+    start_time = g.start_time
+    in_flight_requests.inc()  # balanced when the stream finishes
+
+    def generate():
+        sent = 0
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if sent + len(chunk) > max_body_size:
+                    yield chunk[:max_body_size - sent]
+                    # Same marker a buffered body gets, so the cut is visible to the client
+                    yield TRUNCATION_MARKER.format(limit=max_body_size).encode()
+                    break
+                sent += len(chunk)
+                yield chunk
+        finally:
+            response.close()
+            observe_upstream(api_url, api_method, response.status_code, time.time() - start_time)
+            in_flight_requests.dec()
+
+    headers = passthrough_headers(response.headers)
+    headers["X-Upstream-TTFB"] = f"{time_to_first_byte:.6f}"
+    headers["X-Max-Body-Size"] = str(max_body_size)
+    return Response(generate(), status=response.status_code, headers=headers)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus exposition endpoint"""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+@app.route('/system_metrics', methods=['GET'])
+def system_metrics():
+    """Recent CPU, memory, open-file and network samples from the background sampler"""
+    seconds = request.args.get('seconds', type=float)
+    return jsonify({
+        "interval": system_sampler.interval,
+        "latest": system_sampler.latest(),
+        "samples": system_sampler.history(seconds)
+    })
+
+def parse_load_request():
+    """Return (spec, options, error_response) for a load test payload"""
+    if not request.is_json:
+        return None, None, (jsonify({"error": "Content-Type must be application/json"}), 415)
+
+    data = request.get_json()
+    api_method = data.get('apiMethod')
+    api_url = data.get('apiURL')
+
+    if not api_method:
+        return None, None, (jsonify({"error": "API method is required"}), 400)
+    if not api_url:
+        return None, None, (jsonify({"error": "API URL is required"}), 400)
+
+    try:
+        options = parse_load_options(data)
+        headers = parse_headers(data.get('apiHeaders'))
+        assertions = compile_assertions(data.get('apiAssertions'))
+    except (TypeError, ValueError) as e:
+        return None, None, (jsonify({"error": str(e)}), 400)
+
+    spec = {
+        "method": api_method,
+        "url": api_url,
+        "headers": headers,
+        "body": data.get('apiBody') or None,
+        "assertions": assertions
+    }
+    return spec, options, None
+
+@app.route('/load_test', methods=['POST'])
+@limiter.limit("5 per minute")
+def load_test():
+    """Fire a small burst of concurrent requests at the target and report latency percentiles.
+
+    Runs are capped so the answer arrives within the request; use
+    /load_test/jobs for anything larger.
+    """
+    spec, options, error = parse_load_request()
+    if error:
+        return error
+    try:
+        options = sync_options(options)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        return jsonify(run_load_test(**spec, **options))
+    except Exception as e:
+        error_counter.inc()
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+
+@app.route('/load_test/jobs', methods=['POST'])
+@limiter.limit("5 per minute")
+def start_load_test_job():
+    """Start a load test in the background and return its job id"""
+    spec, options, error = parse_load_request()
+    if error:
+        return error
+
+    try:
+        job = load_jobs.start(spec, options)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/load_test/jobs/<job_id>', methods=['GET'])
+def get_load_test_job(job_id):
+    """Current status and, once finished, the summary of a load test job"""
+    job = load_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.describe())
+
+@app.route('/load_test/jobs/<job_id>', methods=['DELETE'])
+def cancel_load_test_job(job_id):
+    """Stop a running load test; the summary covers requests sent so far"""
+    job = load_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    job.cancel()
+    return jsonify({"job_id": job.id, "status": "cancelling"}), 202
+
+@app.route('/load_test/jobs/<job_id>/stream', methods=['GET'])
+def stream_load_test_job(job_id):
+    """Server-Sent Events feed of per-second latency histograms and error counts"""
+    job = load_jobs.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        last_seq = 0
+        while True:
+            events = job.wait_events(last_seq, timeout=15)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for seq, event, data in events:
+                last_seq = seq
+                yield f"id: {seq}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+                if event == "done":
+                    return
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/run_collection', methods=['POST'])
+@limiter.limit("5 per minute")
+def run_collection_endpoint():
+    """Run a JSONL collection of request specs and stream JSONL results back"""
+    concurrency = request.args.get('concurrency', COLLECTION_CONCURRENCY, type=int)
+    if not 1 <= concurrency <= COLLECTION_MAX_CONCURRENCY:
+        return jsonify({"error": f"concurrency must be between 1 and {COLLECTION_MAX_CONCURRENCY}"}), 400
+
+    def generate():
+        for result in run_collection(parse_specs(request.stream), http_client, concurrency):
+            request_counter.inc()
+            if not result.get("ok"):
+                error_counter.inc()
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 if __name__ == '__main__':
     app.run(debug=True, port=5500)
@@ -0,0 +1,210 @@
+"""ASGI variant of apichecker.py.
+
+Serves the same /test_api contract and metrics, but proxies upstream calls
+on an asyncio event loop so one process can hold thousands of slow
+upstream requests without tying up a worker thread per call.
+
+Run with any ASGI server, e.g.:
+    uvicorn apichecker_asgi:app --port 5500
+"""
+import math
+import time
+from functools import wraps
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from quart import Quart, Response, jsonify, request
+from quart_cors import cors
+
+from assertions import AssertionSpecError, ResponseView, compile_assertions
+from asyncclient import AsyncPooledClient
+from metrics import (SlidingWindowRate, error_counter, in_flight_requests, observe_upstream,
+                     request_counter, sample_value)
+from ratelimit import RateLimiter, RateLimitExceeded
+from sampler import SystemSampler
+from streaming import (CHUNK_SIZE, TRUNCATION_MARKER, aread_limited, body_limit, decode_body,
+                       passthrough_headers)
+
+app = Quart(__name__)
+app = cors(app, allow_origin=["http://localhost:3000"], allow_methods=["GET", "POST"],
+           allow_headers=["Content-Type"])
+
+# Rate Limiting Setup (storage shared between workers via RATE_LIMIT_STORAGE)
+limiter = RateLimiter()
+
+# Shared keep-alive client for outbound calls, created on the serving loop
+http_client = None
+
+# Host metrics sampled off the request path
+system_sampler = SystemSampler()
+
+# Throughput Tracking
+request_rate = SlidingWindowRate()
+
+
+@app.before_serving
+async def startup():
+    global http_client
+    http_client = AsyncPooledClient()
+    system_sampler.start()
+
+
+@app.after_serving
+async def shutdown():
+    system_sampler.stop()
+    await http_client.close()
+
+
+def rate_limit(rate):
+    """Async counterpart of RateLimiter.limit for Quart views"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(*args, **kwargs):
+            try:
+                await limiter.hit_async(f"{view.__name__}:{request.remote_addr}", rate)
+            except RateLimitExceeded as e:
+                return jsonify({"error": str(e)}), 429, {"Retry-After": str(math.ceil(e.retry_after))}
+            return await view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+@app.route('/test_api', methods=['POST'])
+@rate_limit("10 per minute")  # Rate limit: 10 requests per minute per IP
+async def test_api():
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 415
+
+    api_method = api_url = None
+    start_time = time.time()
+    try:
+        in_flight_requests.inc()
+        request_rate.hit()
+        request_counter.inc()
+        request_size = request.content_length or 0
+
+        data = await request.get_json()
+        api_method = data.get('apiMethod')
+        api_url = data.get('apiURL')
+        api_body = data.get('apiBody')
+        api_headers = data.get('apiHeaders', {})
+
+        if not api_method:
+            return jsonify({"error": "API method is required"}), 400
+        if not api_url:
+            return jsonify({"error": "API URL is required"}), 400
+
+        try:
+            assertions = compile_assertions(data.get('apiAssertions'))
+        except AssertionSpecError as e:
+            return jsonify({"error": f"Invalid assertions: {str(e)}"}), 400
+        try:
+            max_body_size = body_limit(data.get('apiMaxBodySize'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = await http_client.request(
+            api_method,
+            api_url,
+            headers=api_headers,
+            json=api_body if api_body else None,
+            stream=True
+        )
+        time_to_first_byte = time.time() - start_time
+
+        if data.get('apiStream'):
+            return stream_upstream(response, api_url, api_method, max_body_size,
+                                   start_time, time_to_first_byte)
+
+        try:
+            body, truncated = await aread_limited(response.aiter_bytes(CHUNK_SIZE), max_body_size)
+        finally:
+            await response.aclose()
+
+        latency = time.time() - start_time
+        observe_upstream(api_url, api_method, response.status_code, latency)
+        system = system_sampler.latest()
+
+        response_data = {
+            "status_code": response.status_code,
+            "headers": dict(response.headers),
+            "data": decode_body(response.status_code, response.headers, body, truncated,
+                                max_body_size, response.encoding),
+            "truncated": truncated,
+            "metrics": {
+                "response_time": latency,
+                "time_to_first_byte": time_to_first_byte,
+                "request_size": request_size,
+                "response_size": len(body),
+                "cpu_usage": system["cpu_usage"],
+                "memory_usage": system["memory_usage"],
+                "process_rss": system["process_rss"],
+                "requests_per_second": request_rate.rate(),
+                "total_requests": sample_value('flask_requests_total'),
+                "error_count": sample_value('flask_errors_total'),
+                "connection_pool": http_client.metrics()
+            }
+        }
+
+        if assertions:
+            response_data["assertions"] = assertions.evaluate(ResponseView(
+                response.status_code, response.headers, body, latency))
+
+        return jsonify(response_data)
+
+    except httpx.HTTPError as e:
+        error_counter.inc()
+        observe_upstream(api_url, api_method, None, time.time() - start_time)
+        return jsonify({"error": f"Request failed: {str(e)}"}), 500
+    except Exception as e:
+        error_counter.inc()
+        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    finally:
+        in_flight_requests.dec()
+
+
+def stream_upstream(response, api_url, api_method, max_body_size, start_time, time_to_first_byte):
+    """Relay the upstream body as a chunked stream without buffering or parsing it"""
+    in_flight_requests.inc()  # balanced when the stream finishes
+
+    async def generate():
+        sent = 0
+        try:
+            async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                if sent + len(chunk) > max_body_size:
+                    yield chunk[:max_body_size - sent]
+                    # Same marker a buffered body gets, so the cut is visible to the client
+                    yield TRUNCATION_MARKER.format(limit=max_body_size).encode()
+                    break
+                sent += len(chunk)
+                yield chunk
+        finally:
+            await response.aclose()
+            observe_upstream(api_url, api_method, response.status_code, time.time() - start_time)
+            in_flight_requests.dec()
+
+    headers = passthrough_headers(response.headers)
+    headers["X-Upstream-TTFB"] = f"{time_to_first_byte:.6f}"
+    headers["X-Max-Body-Size"] = str(max_body_size)
+    return Response(generate(), status=response.status_code, headers=headers)
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus exposition endpoint"""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+@app.route('/system_metrics', methods=['GET'])
+async def system_metrics():
+    """Recent CPU, memory, open-file and network samples from the background sampler"""
+    seconds = request.args.get('seconds', type=float)
+    return jsonify({
+        "interval": system_sampler.interval,
+        "latest": system_sampler.latest(),
+        "samples": system_sampler.history(seconds)
+    })
+
+
+if __name__ == '__main__':
+    app.run(port=5500)
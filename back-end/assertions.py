@@ -0,0 +1,362 @@
+"""Declarative response assertions, compiled once and evaluated many times.
+
+A request spec may carry an "apiAssertions" list, for example:
+
+    [{"type": "status", "range": "2xx"},
+     {"type": "jsonpath", "path": "$.items[0].name", "equals": "widget"},
+     {"type": "jsonpath", "path": "$.id", "matches": "^[0-9a-f]{24}$"},
+     {"type": "header", "name": "Content-Type", "matches": "json"},
+     {"type": "schema", "schema": {"type": "object", "required": ["items"]}},
+     {"type": "latency", "max_ms": 500}]
+
+Wildcard JSONPath steps ([*], .*) must hold for every selected element.
+Any assertion may set "label" to override its name in the results.
+
+compile_assertions() turns the list into matcher closures (regexes and
+JSONPath steps are parsed up front) so a load test can reuse them for
+every response.
+"""
+import json
+import re
+from functools import lru_cache
+
+_MISSING = object()
+
+
+class AssertionSpecError(ValueError):
+    """Raised when an assertion list cannot be compiled"""
+
+
+class ResponseView:
+    """What the matchers look at; the JSON body is parsed at most once"""
+
+    def __init__(self, status_code, headers, body, latency):
+        self.status_code = status_code
+        self.headers = {k.lower(): v for k, v in (headers or {}).items()}
+        self.body = body
+        self.latency = latency
+        self._json = _MISSING
+
+    @property
+    def json(self):
+        if self._json is _MISSING:
+            try:
+                self._json = json.loads(self.body) if self.body else None
+            except ValueError:
+                self._json = None
+        return self._json
+
+
+# JSONPath subset: $, .key, ['key'], [index], [*], .*
+_PATH_TOKEN = re.compile(r"\.([A-Za-z_$][\w$-]*)|\.\*|\[\*\]|\[(-?\d+)\]|\[['\"]([^'\"]+)['\"]\]")
+
+
+def compile_path(path):
+    """Parse a JSONPath expression into a list of (kind, key) steps"""
+    if not path.startswith('$'):
+        raise AssertionSpecError(f"JSONPath must start with '$': {path}")
+    steps, pos = [], 1
+    while pos < len(path):
+        match = _PATH_TOKEN.match(path, pos)
+        if not match:
+            raise AssertionSpecError(f"Unsupported JSONPath syntax at {path[pos:]!r}")
+        name, index, quoted = match.groups()
+        if name is not None or quoted is not None:
+            steps.append(('key', name if name is not None else quoted))
+        elif index is not None:
+            steps.append(('index', int(index)))
+        else:
+            steps.append(('wildcard', None))
+        pos = match.end()
+    return steps
+
+
+def resolve_path(steps, document):
+    """Return every value the compiled path selects from document"""
+    values = [document]
+    for kind, key in steps:
+        selected = []
+        for value in values:
+            if kind == 'key' and isinstance(value, dict) and key in value:
+                selected.append(value[key])
+            elif kind == 'index' and isinstance(value, list) and -len(value) <= key < len(value):
+                selected.append(value[key])
+            elif kind == 'wildcard':
+                if isinstance(value, dict):
+                    selected.extend(value.values())
+                elif isinstance(value, list):
+                    selected.extend(value)
+        values = selected
+    return values
+
+
+_JSON_TYPES = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+
+def compile_schema(schema, where='$'):
+    """Compile a JSON Schema subset into a validator returning an error message or None.
+
+    Supports type, enum, required, properties, items, minimum, maximum,
+    minLength, maxLength and pattern.
+    """
+    if not isinstance(schema, dict):
+        raise AssertionSpecError(f"Schema at {where} must be an object")
+    checks = []
+
+    types = schema.get('type')
+    if types is not None:
+        types = [types] if isinstance(types, str) else list(types)
+        unknown = [t for t in types if t not in _JSON_TYPES]
+        if unknown:
+            raise AssertionSpecError(f"Unknown schema type {unknown[0]!r} at {where}")
+        type_checks = [_JSON_TYPES[t] for t in types]
+        checks.append(lambda v, p: None if any(c(v) for c in type_checks)
+                      else f"{p}: expected {' or '.join(types)}")
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+        checks.append(lambda v, p: None if v in allowed else f"{p}: {v!r} not in enum")
+
+    for keyword, test in (('minimum', lambda v, n: v >= n), ('maximum', lambda v, n: v <= n)):
+        if keyword in schema:
+            if not _JSON_TYPES['number'](schema[keyword]):
+                raise AssertionSpecError(f"{keyword} at {where} must be a number")
+
+            def check(v, p, bound=schema[keyword], test=test, keyword=keyword):
+                if _JSON_TYPES['number'](v) and not test(v, bound):
+                    return f"{p}: {v} violates {keyword} {bound}"
+            checks.append(check)
+
+    for keyword, test in (('minLength', lambda v, n: len(v) >= n), ('maxLength', lambda v, n: len(v) <= n)):
+        if keyword in schema:
+            if not _JSON_TYPES['integer'](schema[keyword]) or schema[keyword] < 0:
+                raise AssertionSpecError(f"{keyword} at {where} must be a non-negative integer")
+
+            def check(v, p, bound=schema[keyword], test=test, keyword=keyword):
+                if isinstance(v, str) and not test(v, bound):
+                    return f"{p}: length {len(v)} violates {keyword} {bound}"
+            checks.append(check)
+
+    if 'pattern' in schema:
+        pattern = _compile_regex(schema['pattern'])
+        checks.append(lambda v, p: None if not isinstance(v, str) or pattern.search(v)
+                      else f"{p}: does not match {pattern.pattern!r}")
+
+    required = schema.get('required') or []
+    if required:
+        checks.append(lambda v, p: next((f"{p}: missing required property {k!r}"
+                                         for k in required if isinstance(v, dict) and k not in v), None))
+
+    properties = {k: compile_schema(s, f"{where}.{k}") for k, s in (schema.get('properties') or {}).items()}
+    if properties:
+        def check_properties(v, p):
+            if isinstance(v, dict):
+                for key, validate in properties.items():
+                    if key in v:
+                        error = validate(v[key], f"{p}.{key}")
+                        if error:
+                            return error
+        checks.append(check_properties)
+
+    if 'items' in schema:
+        validate_item = compile_schema(schema['items'], f"{where}[]")
+
+        def check_items(v, p):
+            if isinstance(v, list):
+                for i, item in enumerate(v):
+                    error = validate_item(item, f"{p}[{i}]")
+                    if error:
+                        return error
+        checks.append(check_items)
+
+    def validate(value, path=where):
+        for check in checks:
+            error = check(value, path)
+            if error:
+                return error
+        return None
+
+    return validate
+
+
+def _compile_regex(pattern):
+    try:
+        return re.compile(pattern)
+    except (re.error, TypeError) as e:
+        raise AssertionSpecError(f"Invalid regex {pattern!r}: {e}")
+
+
+def _status_matcher(spec):
+    if 'equals' in spec:
+        expected = int(spec['equals'])
+        return lambda code: code == expected, f"status == {expected}"
+    if 'in' in spec:
+        allowed = {int(c) for c in spec['in']}
+        return lambda code: code in allowed, f"status in {sorted(allowed)}"
+    if 'range' in spec:
+        match = re.fullmatch(r"([1-5])xx", str(spec['range']).lower())
+        if not match:
+            raise AssertionSpecError(f"Invalid status range {spec['range']!r}, expected e.g. '2xx'")
+        low = int(match.group(1)) * 100
+        return lambda code: low <= code < low + 100, f"status {spec['range']}"
+    if 'min' in spec or 'max' in spec:
+        low, high = int(spec.get('min', 100)), int(spec.get('max', 599))
+        return lambda code: low <= code <= high, f"{low} <= status <= {high}"
+    raise AssertionSpecError("status assertion needs equals, in, range or min/max")
+
+
+def _compile_status(spec):
+    test, name = _status_matcher(spec)
+
+    def check(view):
+        if test(view.status_code):
+            return None
+        return f"got status {view.status_code}"
+    return name, check
+
+
+def _compile_value_checks(spec, label):
+    """Shared equals/matches/exists handling for JSONPath and header assertions"""
+    checks = []
+    if 'exists' in spec:
+        should_exist = bool(spec['exists'])
+        checks.append(lambda found, value: None if found == should_exist
+                      else f"{label} {'missing' if should_exist else 'present'}")
+    if 'equals' in spec:
+        expected = spec['equals']
+        checks.append(lambda found, value: None if found and value == expected
+                      else f"{label} is {value!r}, expected {expected!r}")
+    if 'matches' in spec:
+        pattern = _compile_regex(spec['matches'])
+        checks.append(lambda found, value: None if found and pattern.search(
+            value if isinstance(value, str) else json.dumps(value))
+            else f"{label} {value!r} does not match {pattern.pattern!r}")
+    if not checks:
+        checks.append(lambda found, value: None if found else f"{label} missing")
+    return checks
+
+
+def _compile_jsonpath(spec):
+    path = spec.get('path')
+    if not isinstance(path, str):
+        raise AssertionSpecError("jsonpath assertion needs a path")
+    steps = compile_path(path)
+    single = all(kind != 'wildcard' for kind, _ in steps)
+    checks = _compile_value_checks(spec, path)
+
+    def check(view):
+        values = resolve_path(steps, view.json)
+        if single:
+            candidates = [(True, values[0])] if values else [(False, None)]
+        else:
+            # Wildcard paths must hold for every selected element
+            candidates = [(True, v) for v in values] or [(False, None)]
+        for c in checks:
+            for found, value in candidates:
+                error = c(found, value)
+                if error:
+                    return error
+        return None
+    return f"jsonpath {path}", check
+
+
+def _compile_header(spec):
+    name = spec.get('name')
+    if not isinstance(name, str):
+        raise AssertionSpecError("header assertion needs a name")
+    key = name.lower()
+    checks = _compile_value_checks(spec, f"header {name}")
+
+    def check(view):
+        value = view.headers.get(key)
+        for c in checks:
+            error = c(value is not None, value)
+            if error:
+                return error
+        return None
+    return f"header {name}", check
+
+
+def _compile_schema(spec):
+    validate = compile_schema(spec.get('schema'))
+
+    def check(view):
+        if view.json is None and view.body:
+            return "body is not JSON"
+        return validate(view.json)
+    return "schema", check
+
+
+def _compile_latency(spec):
+    try:
+        budget_ms = float(spec['max_ms'])
+    except (KeyError, TypeError, ValueError):
+        raise AssertionSpecError("latency assertion needs a numeric max_ms")
+
+    def check(view):
+        took_ms = view.latency * 1000
+        return None if took_ms <= budget_ms else f"took {took_ms:.1f} ms, budget {budget_ms:g} ms"
+    return f"latency <= {budget_ms:g} ms", check
+
+
+_COMPILERS = {
+    'status': _compile_status,
+    'jsonpath': _compile_jsonpath,
+    'header': _compile_header,
+    'schema': _compile_schema,
+    'latency': _compile_latency,
+}
+
+
+class CompiledAssertions:
+    """A ready-to-run list of (name, check) matchers"""
+
+    def __init__(self, matchers):
+        self.matchers = matchers
+
+    def __len__(self):
+        return len(self.matchers)
+
+    def evaluate(self, view):
+        results = []
+        for name, check in self.matchers:
+            try:
+                error = check(view)
+            except Exception as e:
+                error = f"assertion error: {e}"
+            results.append({"name": name, "passed": error is None, "message": error})
+        return {"passed": all(r["passed"] for r in results), "results": results}
+
+
+@lru_cache(maxsize=256)
+def _compile_cached(canonical):
+    matchers = []
+    for i, spec in enumerate(json.loads(canonical)):
+        if not isinstance(spec, dict) or spec.get('type') not in _COMPILERS:
+            raise AssertionSpecError(f"Assertion {i}: type must be one of {', '.join(_COMPILERS)}")
+        try:
+            name, check = _COMPILERS[spec['type']](spec)
+        except AssertionSpecError:
+            raise
+        except (TypeError, ValueError, KeyError) as e:
+            # Malformed values the compilers did not anticipate are still bad input
+            raise AssertionSpecError(f"Assertion {i}: {e}") from None
+        matchers.append((spec.get('label') or name, check))
+    return CompiledAssertions(matchers)
+
+
+def compile_assertions(specs):
+    """Compile an assertion list; identical lists share one compiled object"""
+    if not specs:
+        return None
+    if not isinstance(specs, list):
+        raise AssertionSpecError("assertions must be a list")
+    return _compile_cached(json.dumps(specs, sort_keys=True))
@@ -0,0 +1,72 @@
+import httpx
+
+from httpclient import (CONNECT_TIMEOUT, HOST_RATE_LIMIT, HOST_WAIT_TIMEOUT, POOL_MAXSIZE,
+                        READ_TIMEOUT, RETRY_TOTAL, PoolStats, host_key)
+from ratelimit import RateLimiter, RateLimitExceeded
+
+# Configuration
+MAX_CONNECTIONS = 1000  # Upstream connections across all hosts
+
+
+class HostRateLimited(httpx.HTTPError):
+    """Raised when a target host's outbound rate limit stays exhausted"""
+
+
+class AsyncPooledClient:
+    """asyncio counterpart of httpclient.PooledClient, built on httpx.
+
+    One event loop can keep thousands of upstream calls in flight while
+    reusing keep-alive connections per host. Connection setup is observed
+    through httpcore trace events so the same pool counters are reported.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, max_keepalive=POOL_MAXSIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRY_TOTAL, host_rate_limit=HOST_RATE_LIMIT, host_limiter=None):
+        self.stats = PoolStats()
+        self.host_rate_limit = host_rate_limit
+        self.host_limiter = host_limiter or RateLimiter()
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            # httpx only retries failed connection attempts, never sent requests
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+            follow_redirects=True,
+        )
+
+    async def request(self, method, url, stream=False, **kwargs):
+        """Send a request through the shared pool.
+
+        With stream=True only the headers are read; the caller must consume
+        the body and call response.aclose().
+        """
+        if self.host_rate_limit:
+            try:
+                await self.host_limiter.wait_async(host_key(url), self.host_rate_limit, HOST_WAIT_TIMEOUT)
+            except RateLimitExceeded as e:
+                raise HostRateLimited(f"Outbound {e} for {httpx.URL(url).netloc.decode()}") from None
+
+        opened = False
+
+        async def trace(event_name, info):
+            nonlocal opened
+            if event_name == "connection.connect_tcp.complete":
+                opened = True
+
+        extensions = dict(kwargs.pop("extensions", None) or {}, trace=trace)
+        built = self.client.build_request(method, url, extensions=extensions, **kwargs)
+        response = await self.client.send(built, stream=stream)
+        if opened:
+            self.stats.incr("pool_misses")
+            self.stats.incr("connections_opened")
+        else:
+            self.stats.incr("pool_hits")
+            self.stats.incr("connections_reused")
+        return response
+
+    def metrics(self):
+        return self.stats.snapshot()
+
+    async def close(self):
+        await self.client.aclose()
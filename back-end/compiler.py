@@ -1,14 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import subprocess
 import sys
 import os
-import random
 import time
 import tempfile
-import socket
+import json
 import psutil
 import threading
+import requests
+from interpreter_pool import InterpreterPool, PoolUnavailable
+from readiness import READY_MARKER, OutputWatcher, reported_port, wait_until_ready
+from streamrun import StreamingRun
+from scheduler import RunScheduler, QueueFull
+from runlimits import MeteredPopen, SERVER_LIMITS, run_limited
+from procgroup import LaunchedApp, Reaper, kill_tree, popen_kwargs
+from ports import NoCapacity, PortAllocator
+from resultcache import ResultCache, cache_key, is_cacheable
+from preflight import analyze
+from httpclient import PooledClient
+from streaming import CHUNK_SIZE, SizedStream, proxy_headers
 
 app = Flask(__name__)
 CORS(app)
@@ -16,61 +27,91 @@ CORS(app)
 # Configuration
 FLASK_PORT_START = 6000
 FLASK_PORT_END = 6100
-used_ports = set()
-running_processes = {}
+# Let the OS pick each app's port (reported back on the readiness line) instead of the range above
+EPHEMERAL_PORTS = os.environ.get('FLASK_EPHEMERAL_PORTS', '').lower() in ('1', 'true', 'yes')
+USE_INTERPRETER_POOL = os.name != 'nt'  # the pool relies on select() over pipes
+port_allocator = PortAllocator(FLASK_PORT_START, FLASK_PORT_END)
+running_processes = {}  # port -> LaunchedApp
+apps_by_id = {}  # LaunchedApp.id -> LaunchedApp, for the /apps gateway
+processes_lock = threading.Lock()  # guards running_processes and apps_by_id
 
-def is_port_in_use(port):
-    """Check if a port is already in use"""
-    try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(1)
-            result = s.connect_ex(('127.0.0.1', port))
-            return result == 0
-    except:
-        return True
-
-def get_free_port():
-    """Get a random free port"""
-    while True:
-        port = random.randint(FLASK_PORT_START, FLASK_PORT_END)
-        if port not in used_ports and not is_port_in_use(port):
-            used_ports.add(port)
-            return port
+# Keep-alive connections to launched apps, shared by every gateway request
+gateway_client = PooledClient(retries=0, host_rate_limit=None)
+
+# Scripts whose output is being streamed, by run id
+streaming_runs = {}
+streaming_lock = threading.Lock()
+
+# Bounds how many runs execute at once; the rest queue fairly per client
+run_scheduler = RunScheduler()
+
+# Warm interpreters for regular (non-Flask) scripts, one per admitted run
+interpreter_pool = InterpreterPool(size=run_scheduler.max_workers) if USE_INTERPRETER_POOL else None
+
+def launched_apps():
+    with processes_lock:
+        return list(running_processes.values())
+
+# Results of deterministic scripts, for requests that opt in with "cache": true
+result_cache = ResultCache()
 
 def cleanup_process(port):
     """Clean up process running on a specific port"""
-    if port in running_processes:
+    with processes_lock:
+        launched = running_processes.pop(port, None)
+        if launched is not None:
+            apps_by_id.pop(launched.id, None)
+    if launched is not None:
         try:
-            process = running_processes[port]
-            if process.poll() is None:  # Process is still running
-                # Kill process tree on Windows
-                subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], 
-                             capture_output=True)
+            kill_tree(launched.process)
         except Exception as e:
             print(f"Error cleaning up process: {e}")
-        finally:
-            used_ports.discard(port)
-            running_processes.pop(port, None)
-
-def modify_flask_code(code, port):
-    """Modify Flask code to run on specific port with Windows compatibility"""
-    # Split the code into lines
-    lines = code.splitlines()
-    
-    # Remove any existing if __name__ == '__main__': block
-    filtered_lines = [line for line in lines 
-                     if not line.strip().startswith('if __name__')
-                     and not line.strip().startswith('app.run')]
-    
-    # Add our custom run configuration
-    new_code = '\n'.join(filtered_lines) + """
+    port_allocator.release(port)
+
+# Stops launched apps that went idle or outlived their maximum lifetime;
+# started at import so it also runs under gunicorn or `flask run`
+reaper = Reaper(launched_apps, cleanup_process).start()
+
+def modify_flask_code(analysis, port):
+    """Replace the app's own entrypoint with a server on a specific port"""
+    # The marker line tells us the server is listening
+    return analysis.runnable_code + """
 
 if __name__ == '__main__':
-    from werkzeug.serving import run_simple
-    run_simple('127.0.0.1', {port}, app, use_debugger=False, use_reloader=False)
-""".format(port=port)
-    
-    return new_code
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', {port}, {app}, threaded=True)
+    print('{marker}', server.server_port, flush=True)
+    server.serve_forever()
+""".format(port=port, app=analysis.app_name, marker=READY_MARKER)
+
+def syntax_error_response(analysis):
+    """Reject code that does not parse without starting a process"""
+    error = analysis.syntax_error
+    return jsonify({
+        "error": error["message"],
+        "output": error["message"],
+        "success": False,
+        "syntax_error": {"line": error["line"], "offset": error["offset"]}
+    }), 400
+
+def run_in_pool(code):
+    """Run a regular script on a warm interpreter instead of a fresh process"""
+    try:
+        result = interpreter_pool.run(code)
+    except PoolUnavailable as e:
+        return jsonify(error=str(e)), 503
+    success = result["returncode"] == 0
+    return jsonify({
+        "output": result["stdout"] if success else result["stderr"],
+        "success": success,
+        "usage": result["usage"]
+    }), 200 if success else 400
+
+def queue_full(e):
+    response = jsonify(error=str(e))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 @app.route('/run', methods=['POST'])
 def run_code():
@@ -81,73 +122,289 @@ def run_code():
         if not code:
             return jsonify(error="No code provided"), 400
 
-        # Check if code is a Flask app
-        is_flask_app = 'from flask import Flask' in code and 'app = Flask(__name__)' in code
+        analysis = analyze(code)
+        if analysis.syntax_error:
+            return syntax_error_response(analysis)
 
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-            temp_file = f.name
-            if is_flask_app:
-                port = get_free_port()
-                modified_code = modify_flask_code(code, port)
-                f.write(modified_code)
-            else:
-                f.write(code)
+        # Served from the cache without taking an execution slot
+        key = None
+        if data.get('cache') and not analysis.is_flask_app and is_cacheable(code):
+            key = cache_key(code)
+            hit = result_cache.get(key)
+            if hit is not None:
+                payload, status = hit
+                return jsonify(dict(payload, cached=True)), status
 
         try:
-            if is_flask_app:
-                # Start Flask app as a subprocess
-                process = subprocess.Popen(
+            slot = run_scheduler.acquire(request.remote_addr)
+        except QueueFull as e:
+            return queue_full(e)
+        with slot:
+            response, status = execute_code(analysis)
+        response.headers['X-Queue-Wait'] = f"{slot.waited:.3f}"
+
+        payload = response.get_json()
+        if data.get('cache') and "output" in payload:
+            # Runs cut short by a resource limit depend on load, not on the code
+            if key is not None and not (payload.get("usage") or {}).get("limit_exceeded"):
+                result_cache.put(key, (payload, status))
+            payload["cached"] = False
+            response.set_data(json.dumps(payload))
+        return response, status
+
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+def execute_code(analysis):
+    """Run a snippet or launch a Flask app; the caller holds a scheduler slot"""
+    code = analysis.code
+    is_flask_app = analysis.is_flask_app
+
+    if not is_flask_app and interpreter_pool is not None:
+        return run_in_pool(code)
+
+    if is_flask_app:
+        try:
+            # Port 0 makes the server bind an OS-assigned port
+            port = 0 if EPHEMERAL_PORTS else port_allocator.lease()
+        except NoCapacity as e:
+            return jsonify(error=str(e)), 503
+
+    # Create a temporary file
+    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
+        temp_file = f.name
+        if is_flask_app:
+            modified_code = modify_flask_code(analysis, port)
+            f.write(modified_code)
+        else:
+            f.write(code)
+
+    try:
+        if is_flask_app:
+            # Start Flask app as a subprocess
+            try:
+                process = MeteredPopen(
                     [sys.executable, temp_file],
+                    limits=SERVER_LIMITS,
                     stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
                     text=True,
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                    **popen_kwargs()
                 )
-                
-                running_processes[port] = process
-                
-                # Wait for the server to start
-                time.sleep(2)
-                
-                # Check if process started successfully
-                if process.poll() is not None:
-                    _, stderr = process.communicate()
-                    cleanup_process(port)
-                    return jsonify(error=f"Failed to start Flask app: {stderr}"), 500
-                
-                # Check if port is actually in use
-                if not is_port_in_use(port):
-                    cleanup_process(port)
+            except Exception:
+                port_allocator.release(port)
+                raise
+            watcher = OutputWatcher(process.stdout)
+            
+            # Wait until the server reports ready or accepts connections
+            try:
+                startup_time = wait_until_ready(process, port or None, watcher)
+            except (RuntimeError, TimeoutError) as e:
+                kill_tree(process)
+                watcher.thread.join(timeout=1)
+                port_allocator.release(port)
+                if isinstance(e, TimeoutError):
                     return jsonify(error="Flask app failed to bind to port"), 500
-                
-                url = f"http://127.0.0.1:{port}"
-                return jsonify({
-                    "url": url,
-                    "message": "Flask application started successfully",
-                    "port": port
-                }), 200
-            else:
-                # Run regular Python script
-                result = subprocess.run(
-                    [sys.executable, temp_file],
-                    capture_output=True,
-                    text=True,
-                    timeout=30
-                )
-                
-                return jsonify({
-                    "output": result.stdout if result.returncode == 0 else result.stderr,
-                    "success": result.returncode == 0
-                }), 200 if result.returncode == 0 else 400
+                return jsonify(error=f"Failed to start Flask app: {watcher.output()}"), 500
+            
+            port = reported_port(watcher) or port
+            port_allocator.renew(port, ttl=0)  # held until cleanup_process()
+            launched = LaunchedApp(port, process)
+            with processes_lock:
+                running_processes[port] = launched
+                apps_by_id[launched.id] = launched
+            
+            url = f"http://127.0.0.1:{port}"
+            return jsonify({
+                "url": url,
+                "app_id": launched.id,
+                "gateway_url": f"{request.host_url}apps/{launched.id}/",
+                "message": "Flask application started successfully",
+                "port": port,
+                "startup_time": startup_time
+            }), 200
+        else:
+            # Run regular Python script
+            returncode, stdout, stderr, usage = run_limited([sys.executable, temp_file], timeout=30)
+            
+            return jsonify({
+                "output": stdout if returncode == 0 else stderr,
+                "success": returncode == 0,
+                "usage": usage
+            }), 200 if returncode == 0 else 400
+
+    finally:
+        # Cleanup temporary file
+        try:
+            os.unlink(temp_file)
+        except:
+            pass
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/run/stream', methods=['POST'])
+def run_code_stream():
+    """Run a script and stream its stdout/stderr line by line as Server-Sent Events"""
+    try:
+        data = request.get_json()
+        code = data.get('code')
+        
+        if not code:
+            return jsonify(error="No code provided"), 400
+
+        analysis = analyze(code)
+        if analysis.syntax_error:
+            return syntax_error_response(analysis)
+
+        try:
+            slot = run_scheduler.acquire(request.remote_addr)
+        except QueueFull as e:
+            return queue_full(e)
+        try:
+            run = StreamingRun(code)
+        except Exception:
+            slot.release()
+            raise
+    except Exception as e:
+        return jsonify(error=str(e)), 500
 
+    with streaming_lock:
+        streaming_runs[run.id] = run
+
+    def generate():
+        try:
+            yield sse("started", {"run_id": run.id})
+            for event, payload in run.events():
+                if event is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield sse(event, payload)
         finally:
-            # Cleanup temporary file
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+            run.close()
+            slot.release()
+            with streaming_lock:
+                streaming_runs.pop(run.id, None)
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # A generator that never started skips its finally block
+    response.call_on_close(run.close)
+    response.call_on_close(slot.release)
+    return response
+
+@app.route('/run/<run_id>/cancel', methods=['POST'])
+def cancel_run(run_id):
+    """Stop a streamed script mid-run"""
+    with streaming_lock:
+        run = streaming_runs.get(run_id)
+    if not run:
+        return jsonify(error="Run not found"), 404
+    run.cancel()
+    return jsonify(message=f"Cancelled run {run_id}"), 200
+
+@app.route('/run/metrics', methods=['GET'])
+def run_metrics():
+    """Scheduler queue depth, wait times and executor state"""
+    with processes_lock:
+        apps = len(running_processes)
+    with streaming_lock:
+        streams = len(streaming_runs)
+    return jsonify({
+        "scheduler": run_scheduler.metrics(),
+        "interpreter_pool": interpreter_pool.metrics() if interpreter_pool is not None else None,
+        "flask_apps": apps,
+        "ports": port_allocator.metrics(),
+        "result_cache": result_cache.metrics(),
+        "reaped_apps": dict(reaper.reaped),
+        "streaming_runs": streams
+    }), 200
+
+@app.route('/apps', methods=['GET'])
+def list_apps():
+    """Launched apps with their uptime, idle time and time left before reaping"""
+    return jsonify(apps=[launched.describe() for launched in launched_apps()]), 200
+
+PROXY_METHODS = ['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS']
+# Sent by requests.Session unless overridden; the proxy forwards only what the client sent
+SESSION_DEFAULT_HEADERS = ('User-Agent', 'Accept', 'Accept-Encoding')
+
+@app.route('/apps/<app_id>/', defaults={'subpath': ''}, methods=PROXY_METHODS)
+@app.route('/apps/<app_id>/<path:subpath>', methods=PROXY_METHODS)
+def gateway(app_id, subpath):
+    """Reverse-proxy a request to a launched app, streaming both bodies"""
+    with processes_lock:
+        launched = apps_by_id.get(app_id)
+    if launched is None:
+        return jsonify(error=f"No app with id {app_id}"), 404
+    launched.touch()
+
+    origin = f"http://127.0.0.1:{launched.port}"
+    prefix = f"/apps/{app_id}"
+    url = f"{origin}/{subpath}"
+    if request.query_string:
+        url += '?' + request.query_string.decode('latin-1')
 
+    headers = {name: None for name in SESSION_DEFAULT_HEADERS}
+    for name, value in proxy_headers(request.headers.items()):
+        if name.lower() not in ('host', 'content-length'):
+            headers[name] = value
+    headers['X-Forwarded-For'] = request.remote_addr or ''
+    headers['X-Forwarded-Host'] = request.host
+    headers['X-Forwarded-Proto'] = request.scheme
+    headers['X-Forwarded-Prefix'] = prefix
+
+    body = None
+    if request.content_length:
+        body = SizedStream(request.stream, request.content_length)
+    elif 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+        body = iter(lambda: request.stream.read(CHUNK_SIZE), b'')
+
+    start = time.perf_counter()
+    try:
+        upstream = gateway_client.request(request.method, url, headers=headers, data=body,
+                                          stream=True, allow_redirects=False, throttle=False)
+    except requests.RequestException as e:
+        launched.record(time.perf_counter() - start, error=True)
+        return jsonify(error=f"App {app_id} is not reachable: {e}"), 502
+    launched.record(time.perf_counter() - start, error=upstream.status_code >= 500)
+
+    response_headers = []
+    for name, value in proxy_headers(upstream.raw.headers.items()):
+        # Keep redirects inside the gateway
+        if name.lower() == 'location':
+            if value.startswith(origin):
+                value = value[len(origin):]
+            if value.startswith('/'):
+                value = prefix + value
+        response_headers.append((name, value))
+
+    def generate():
+        try:
+            yield from upstream.raw.stream(CHUNK_SIZE, decode_content=False)
+        finally:
+            upstream.close()
+
+    response = Response(generate(), status=upstream.status_code, headers=response_headers)
+    response.call_on_close(upstream.close)
+    return response
+
+@app.route('/keepalive', methods=['POST'])
+def keepalive():
+    """Reset the idle timer of a launched app"""
+    try:
+        data = request.get_json()
+        port = data.get('port')
+        
+        if not port:
+            return jsonify(error="No port provided"), 400
+
+        with processes_lock:
+            launched = running_processes.get(int(port))
+        if launched is None:
+            return jsonify(error=f"No app running on port {port}"), 404
+        launched.touch()
+        return jsonify(launched.describe()), 200
     except Exception as e:
         return jsonify(error=str(e)), 500
 
@@ -170,7 +427,8 @@ def cleanup():
 def cleanup_all():
     """Endpoint to cleanup all running processes"""
     try:
-        ports = list(running_processes.keys())
+        with processes_lock:
+            ports = list(running_processes.keys())
         for port in ports:
             cleanup_process(port)
         return jsonify(message=f"Cleaned up all processes"), 200
@@ -179,14 +437,24 @@ def cleanup_all():
 
 def cleanup_on_exit():
     """Cleanup all processes before exit"""
-    for port in list(running_processes.keys()):
+    reaper.stop()
+    gateway_client.close()
+    with processes_lock:
+        ports = list(running_processes.keys())
+    for port in ports:
         cleanup_process(port)
+    if interpreter_pool is not None:
+        interpreter_pool.shutdown()
 
 if __name__ == '__main__':
     try:
         # Register cleanup on exit
         import atexit
         atexit.register(cleanup_on_exit)
+
+        # Warm up the interpreters before the first request arrives
+        if interpreter_pool is not None:
+            interpreter_pool.start()
         
         # Start the main Flask app
         app.run(host='127.0.0.1', port=5600, debug=True, use_reloader=False)
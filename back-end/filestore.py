@@ -0,0 +1,201 @@
+"""Connection and schema bootstrap for the CodeLister file collection.
+
+MONGO_URI selects the database. A `mongomock://` URI runs everything against
+an in-memory mongomock instance instead of a real server, so the service
+and its callers can be exercised without mongod.
+
+bootstrap() is idempotent and runs at startup: it backfills fields that
+older documents lack and ensures the declared INDEXES exist, so parent
+lookups and name-collision checks are index seeks instead of collection
+scans.
+
+Every mutation is stamped with a revision from a single counter document,
+and deletions leave a tombstone carrying the revision they happened at, so
+clients can ask for everything that changed after the revision they hold.
+Revisions are handed out before their write lands and writes can land out
+of order, so each one stays listed as pending on the counter until its
+write is done; current_revision() stops below the oldest pending one, so a
+cursor or ETag never covers a write that is not visible yet.
+
+Items point at their folder through parent_id, the folder's _id as a
+string. Because that does not match the ObjectId type of _id, $graphLookup
+cannot follow the links, so subtrees are collected breadth-first with one
+indexed parent_id query per level.
+"""
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, IndexModel, MongoClient
+from pymongo.errors import ConfigurationError, DuplicateKeyError, OperationFailure, PyMongoError
+
+# Configuration
+MONGO_URI = os.environ.get('MONGO_URI', '')
+DB_NAME = "DataStorage"
+COLLECTION_NAME = "collections"
+COUNTERS_COLLECTION = "counters"
+TOMBSTONES_COLLECTION = "collections_tombstones"
+REVISION_COUNTER = "files_revision"
+# A write that has not finished after this long is assumed to have died with its process
+REVISION_PENDING_TTL = 60  # seconds
+
+INDEXES = [
+    # Folder listing and tree assembly
+    IndexModel([('parent_id', ASCENDING)], name='parent_id'),
+    # No two items with the same name in one folder
+    IndexModel([('parent_id', ASCENDING), ('name', ASCENDING)], name='parent_id_name_unique', unique=True),
+    IndexModel([('updated_at', ASCENDING)], name='updated_at'),
+    # Change feed
+    IndexModel([('rev', ASCENDING)], name='rev'),
+]
+TOMBSTONE_INDEXES = [IndexModel([('rev', ASCENDING)], name='rev')]
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def connect(uri=MONGO_URI):
+    if uri.startswith('mongomock://'):
+        import mongomock  # Only needed for local runs without mongod
+        return mongomock.MongoClient()
+    return MongoClient(uri)
+
+
+def ensure_indexes(collection, indexes=INDEXES):
+    """Create missing indexes; returns the names of the ones that could not be built"""
+    failed = []
+    for index in indexes:
+        try:
+            collection.create_indexes([index])
+        except OperationFailure as e:
+            # e.g. existing duplicate names block the unique index
+            print(f"Could not create index {index.document['name']}: {e}")
+            failed.append(index.document['name'])
+    return failed
+
+
+def bootstrap(collection):
+    """Bring an existing collection up to the current schema"""
+    collection.update_many({'updated_at': {'$exists': False}}, {'$set': {'updated_at': utcnow()}})
+    # Documents from before revisions existed predate every cursor
+    collection.update_many({'rev': {'$exists': False}}, {'$set': {'rev': 0}})
+    ensure_indexes(tombstones(collection), TOMBSTONE_INDEXES)
+    return ensure_indexes(collection)
+
+
+def tombstones(collection):
+    return collection.database[TOMBSTONES_COLLECTION]
+
+
+def _allocate_revision(counters):
+    """Bump the counter and list the new revision as pending, in one compare-and-set"""
+    while True:
+        counter = counters.find_one({'_id': REVISION_COUNTER})
+        if counter is None:
+            try:
+                counters.insert_one({'_id': REVISION_COUNTER, 'value': 0, 'pending': []})
+            except DuplicateKeyError:
+                pass
+            continue
+        rev = counter['value'] + 1
+        result = counters.update_one(
+            {'_id': REVISION_COUNTER, 'value': counter['value']},
+            {'$set': {'value': rev}, '$push': {'pending': {'rev': rev, 'at': time.time()}}})
+        if result.modified_count:
+            return rev
+
+
+@contextmanager
+def revision(db):
+    """Allocate the next revision for a write made inside the block.
+
+    Readers do not advertise the revision, or any later one, until the block
+    exits, so the write must be complete (or abandoned) by then.
+    """
+    counters = db[COUNTERS_COLLECTION]
+    rev = _allocate_revision(counters)
+    try:
+        yield rev
+    finally:
+        counters.update_one({'_id': REVISION_COUNTER}, {'$pull': {'pending': {'rev': rev}}})
+
+
+def current_revision(db):
+    """The highest revision whose write, and every earlier one, has landed"""
+    counters = db[COUNTERS_COLLECTION]
+    counter = counters.find_one({'_id': REVISION_COUNTER})
+    if counter is None:
+        return 0
+    cutoff = time.time() - REVISION_PENDING_TTL
+    pending = [entry['rev'] for entry in counter.get('pending', []) if entry['at'] >= cutoff]
+    if len(pending) < len(counter.get('pending', [])):
+        counters.update_one({'_id': REVISION_COUNTER}, {'$pull': {'pending': {'at': {'$lt': cutoff}}}})
+    return min(pending) - 1 if pending else counter['value']
+
+
+def record_deletions(collection, ids, rev, session=None):
+    """Leave tombstones so change cursors learn about deleted items"""
+    if ids:
+        tombstones(collection).insert_many(
+            [{'file_id': str(file_id), 'rev': rev, 'deleted_at': utcnow()} for file_id in ids],
+            session=session)
+
+
+def subtree(collection, root_ids, projection=None, session=None):
+    """Documents of the given items and everything below them, parents before children"""
+    docs = list(collection.find({'_id': {'$in': list(root_ids)}}, projection, session=session))
+    frontier = [str(doc['_id']) for doc in docs if doc.get('type') == 'folder']
+    seen = {str(doc['_id']) for doc in docs}
+    while frontier:
+        level = [doc for doc in collection.find({'parent_id': {'$in': frontier}}, projection, session=session)
+                 if str(doc['_id']) not in seen]
+        seen.update(str(doc['_id']) for doc in level)
+        docs.extend(level)
+        frontier = [str(doc['_id']) for doc in level if doc.get('type') == 'folder']
+    return docs
+
+
+def run_in_transaction(client, callback):
+    """Run callback(session) in a transaction, or callback(None) where there are none.
+
+    Standalone mongod and mongomock do not support transactions; there the
+    writes are applied without one.
+    """
+    try:
+        with client.start_session() as session:
+            return session.with_transaction(callback)
+    except (NotImplementedError, ConfigurationError):
+        return callback(None)
+    except OperationFailure as e:
+        # 20: IllegalOperation, transactions need a replica set or mongos
+        if e.code != 20:
+            raise
+        return callback(None)
+
+
+def collection_stats(db, collection):
+    """Document count, storage sizes and per-index usage counters"""
+    stats = {
+        "collection": collection.name,
+        "documents": collection.estimated_document_count(),
+        "indexes": {name: {"key": dict(info['key']), "unique": info.get('unique', False)}
+                    for name, info in collection.index_information().items()},
+    }
+    try:
+        raw = db.command({'collStats': collection.name})
+        stats.update(size=raw.get('size'), storage_size=raw.get('storageSize'),
+                     total_index_size=raw.get('totalIndexSize'))
+        for name, size in raw.get('indexSizes', {}).items():
+            stats["indexes"].setdefault(name, {})["size"] = size
+    except (PyMongoError, NotImplementedError):
+        pass  # not available on every deployment (or on mongomock)
+    try:
+        for usage in collection.aggregate([{'$indexStats': {}}]):
+            accesses = usage.get('accesses', {})
+            stats["indexes"].setdefault(usage['name'], {}).update(
+                ops=accesses.get('ops'), since=accesses.get('since'))
+    except (PyMongoError, NotImplementedError):
+        pass
+    return stats
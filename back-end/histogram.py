@@ -0,0 +1,81 @@
+import math
+import threading
+
+# Configuration
+LOWEST_LATENCY = 0.0001     # 100 us, anything faster lands in the first bucket
+HIGHEST_LATENCY = 120.0     # seconds, anything slower lands in the overflow bucket
+SUB_BUCKETS = 20            # buckets per power of two (~3.5% relative error)
+
+
+class LatencyHistogram:
+    """Fixed-size, log-linear latency histogram (HDR-style).
+
+    Memory is constant no matter how many samples are recorded; percentiles
+    are accurate to the width of one bucket.
+    """
+
+    def __init__(self, lowest=LOWEST_LATENCY, highest=HIGHEST_LATENCY, sub_buckets=SUB_BUCKETS):
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.bucket_count = int(math.ceil(math.log2(highest / lowest) * sub_buckets)) + 1
+        self.counts = [0] * (self.bucket_count + 1)  # last slot is overflow
+        self.total = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.lock = threading.Lock()
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        index = int(math.log2(value / self.lowest) * self.sub_buckets) + 1
+        return min(index, self.bucket_count)
+
+    def upper_bound(self, index):
+        """Largest latency that falls into bucket `index`"""
+        if index >= self.bucket_count:
+            return math.inf
+        return self.lowest * 2 ** (index / self.sub_buckets)
+
+    def record(self, value):
+        with self.lock:
+            self.counts[self._index(value)] += 1
+            self.total += 1
+            self.sum += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, pct):
+        with self.lock:
+            return self._percentile(pct)
+
+    def _percentile(self, pct):
+        if not self.total:
+            return None
+        target = max(1, int(math.ceil(pct / 100.0 * self.total)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                # Clamp to the observed range so p100 is exactly the max
+                return min(max(self.upper_bound(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        with self.lock:
+            return {
+                "count": self.total,
+                "min": self.min,
+                "mean": self.sum / self.total if self.total else None,
+                "p50": self._percentile(50),
+                "p90": self._percentile(90),
+                "p99": self._percentile(99),
+                "max": self.max,
+            }
+
+    def buckets(self):
+        """Non-empty buckets as (upper bound, count) pairs"""
+        with self.lock:
+            return [(self.upper_bound(i), n) for i, n in enumerate(self.counts) if n]
@@ -0,0 +1,190 @@
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool, PoolManager
+from urllib3.util.retry import Retry
+
+from ratelimit import RateLimiter, RateLimitExceeded
+
+# Configuration
+POOL_CONNECTIONS = 20        # Number of per-host pools kept alive
+POOL_MAXSIZE = 50            # Keep-alive connections kept per host
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+RETRY_TOTAL = 2
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (502, 503, 504)
+# Shared across all workers through RATE_LIMIT_STORAGE, so load tests can't flood a target
+HOST_RATE_LIMIT = os.environ.get('HOST_RATE_LIMIT', '200 per second')
+HOST_WAIT_TIMEOUT = 5.0  # seconds a call may wait for its host's bucket to refill
+
+
+class HostRateLimited(requests.exceptions.RequestException):
+    """Raised when a target host's outbound rate limit stays exhausted"""
+
+
+def host_key(url):
+    return f"host:{urlsplit(url).netloc}"
+
+
+class PoolStats:
+    """Thread-safe counters describing how the outbound pools are used"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pool_hits": self.pool_hits,
+                "pool_misses": self.pool_misses,
+                "connections_opened": self.connections_opened,
+                "connections_reused": self.connections_reused,
+            }
+
+
+class _CountingPoolMixin:
+    """Counts fresh vs. reused connections checked out of a host pool"""
+
+    stats = None
+
+    def _new_conn(self):
+        if self.stats is not None:
+            self.stats.incr("connections_opened")
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout=timeout)
+        # Fresh connections have never been connected to the server yet
+        if self.stats is not None and getattr(conn, "sock", None) is not None:
+            self.stats.incr("connections_reused")
+        return conn
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class CountingPoolManager(PoolManager):
+    """PoolManager that records per-host pool hits and misses"""
+
+    def __init__(self, *args, stats=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = stats
+        self.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.stats = self.stats
+        if self.stats is not None:
+            self.stats.incr("pool_misses")
+        return pool
+
+    def connection_from_pool_key(self, pool_key, request_context=None):
+        with self.pools.lock:
+            existing = self.pools.get(pool_key) is not None
+        if existing and self.stats is not None:
+            self.stats.incr("pool_hits")
+        return super().connection_from_pool_key(pool_key, request_context)
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = CountingPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            stats=self.stats,
+            **pool_kwargs,
+        )
+
+
+class PooledClient:
+    """Keep-alive HTTP client shared by every proxied request.
+
+    Connections are pooled per target host, so repeated calls to the same
+    API skip the TCP and TLS handshakes. Idempotent requests are retried with
+    exponential backoff on connection errors and gateway failures.
+    """
+
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRY_TOTAL, backoff_factor=RETRY_BACKOFF,
+                 retry_statuses=RETRY_STATUSES, host_rate_limit=HOST_RATE_LIMIT,
+                 host_limiter=None):
+        self.stats = PoolStats()
+        self.host_rate_limit = host_rate_limit
+        self.host_limiter = host_limiter or RateLimiter()
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_statuses,
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            raise_on_status=False,
+        )
+        adapter = PooledAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        # Never leak cookies set by one user's target into another's requests
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def throttle(self, url):
+        """Wait for a token from the target host's outbound bucket"""
+        if self.host_rate_limit:
+            try:
+                self.host_limiter.wait(host_key(url), self.host_rate_limit, HOST_WAIT_TIMEOUT)
+            except RateLimitExceeded as e:
+                raise HostRateLimited(f"Outbound {e} for {urlsplit(url).netloc}") from None
+
+    def request(self, method, url, timeout=None, throttle=True, **kwargs):
+        """Send a request through the shared pools, respecting the per-host rate limit.
+
+        Pass throttle=False when the caller already called throttle() itself,
+        e.g. to keep limiter waits out of a latency measurement.
+        """
+        if throttle:
+            self.throttle(url)
+        return self.session.request(method=method, url=url,
+                                    timeout=timeout or self.timeout, **kwargs)
+
+    def metrics(self):
+        return self.stats.snapshot()
+
+    def close(self):
+        self.session.close()
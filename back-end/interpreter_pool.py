@@ -0,0 +1,319 @@
+"""Pool of pre-started Python interpreters for running snippets.
+
+Each worker is a long-lived `python interpreter_pool.py --worker` process
+that has already paid interpreter startup and PRELOAD_MODULES imports.
+The parent sends a snippet as one JSON line on the worker's stdin; the
+worker forks and runs the snippet in the child the way `python script.py`
+would: saved to a temp directory that is __file__'s home and sys.path[0],
+with the server's own modules out of reach, and stdout/stderr redirected
+at the file-descriptor level (so output of child processes is captured
+too). It answers with one JSON line. The fork
+shares the warm imports copy-on-write, and whatever the snippet changes,
+including preloaded modules and builtins, dies with the child.
+
+Workers start under runlimits.WORKER_LIMITS (memory, open files, file
+size), each in its own process group. The forked child gets RLIMIT_CPU set
+to the snippet's budget; SIGXCPU then raises CpuLimitExceeded inside the
+snippet. Each reply carries the snippet's CPU time and peak RSS from the
+child's wait4() rusage, and its wall time.
+
+Workers are recycled after MAX_RUNS_PER_WORKER runs, or when they crash or
+time out; a timed-out worker is killed together with the snippet it forked.
+"""
+import json
+import os
+import queue
+import select
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+from procgroup import kill_tree, popen_kwargs
+from runlimits import DEFAULT_LIMITS, RunLimits, maxrss_bytes, resource
+from scheduler import MAX_CONCURRENT_RUNS
+
+# Configuration
+# One warm worker per run the scheduler admits, so admission is the only queue
+POOL_SIZE = MAX_CONCURRENT_RUNS
+MAX_RUNS_PER_WORKER = int(os.environ.get('INTERPRETER_MAX_RUNS', 50))
+RUN_TIMEOUT = 30  # seconds
+ACQUIRE_TIMEOUT = 10  # seconds to wait for an idle worker before failing
+PRELOAD_MODULES = ['json', 'math', 'random', 're', 'datetime', 'collections', 'itertools']
+# Process-wide limits for the worker itself; CPU time is budgeted per snippet
+WORKER_LIMITS = RunLimits(cpu_seconds=None)
+# Snippets must not be able to import the server's own modules
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class PoolTimeout(Exception):
+    """The snippet did not finish within the run timeout"""
+
+
+class PoolUnavailable(Exception):
+    """No worker became idle in time"""
+
+
+class CpuLimitExceeded(BaseException):
+    """Raised inside a snippet that used up its CPU-time budget"""
+
+
+class Worker:
+    """Parent-side handle of one warm interpreter"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-u', os.path.abspath(__file__), '--worker'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=WORKER_LIMITS.apply if resource is not None else None,
+            **popen_kwargs()
+        )
+        self.runs = 0
+        self.started_at = time.time()
+        self._buffer = b''
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, code, timeout, cpu_seconds=None):
+        """Send code to the worker and wait for its JSON reply"""
+        request = json.dumps({"code": code, "cpu_seconds": cpu_seconds}).encode('utf-8') + b'\n'
+        self.process.stdin.write(request)
+        self.process.stdin.flush()
+        self.runs += 1
+        return json.loads(self._read_line(timeout))
+
+    def _read_line(self, timeout):
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolTimeout(f"Execution timed out after {timeout} seconds")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise RuntimeError("Interpreter exited unexpectedly")
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line
+
+    def kill(self):
+        # The group also holds the forked child of a snippet that is still running
+        try:
+            kill_tree(self.process, grace=0)
+        except Exception:
+            pass
+
+
+class InterpreterPool:
+    """Hands out warm workers and replaces them according to the recycle policy"""
+
+    def __init__(self, size=POOL_SIZE, max_runs=MAX_RUNS_PER_WORKER):
+        self.size = size
+        self.max_runs = max_runs
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.stats = {"runs": 0, "recycled": 0, "timeouts": 0, "crashes": 0}
+        self.started = False
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return self
+            self.started = True
+        for _ in range(self.size):
+            self.idle.put(Worker())
+        return self
+
+    def _replace(self, worker, reason):
+        worker.kill()
+        with self.lock:
+            self.stats[reason] += 1
+        self.idle.put(Worker())
+
+    def run(self, code, timeout=RUN_TIMEOUT, cpu_seconds=DEFAULT_LIMITS.cpu_seconds):
+        """Run code on a warm worker; returns dict(stdout, stderr, returncode, usage)"""
+        self.start()
+        try:
+            worker = self.idle.get(timeout=ACQUIRE_TIMEOUT)
+        except queue.Empty:
+            raise PoolUnavailable("No interpreter available, try again shortly")
+        if not worker.alive():
+            worker.kill()
+            worker = Worker()
+
+        try:
+            result = worker.run(code, timeout, cpu_seconds)
+        except PoolTimeout:
+            self._replace(worker, "timeouts")
+            raise
+        except Exception:
+            self._replace(worker, "crashes")
+            raise RuntimeError("Interpreter crashed while running the code")
+
+        with self.lock:
+            self.stats["runs"] += 1
+        if worker.runs >= self.max_runs:
+            self._replace(worker, "recycled")
+        else:
+            self.idle.put(worker)
+        return result
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats, size=self.size, idle=self.idle.qsize())
+
+    def shutdown(self):
+        while True:
+            try:
+                self.idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def _limit_cpu(cpu_seconds):
+    """SIGXCPU after cpu_seconds, SIGKILL one second later"""
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft, new_hard = cpu_seconds, cpu_seconds + 1
+    if hard != resource.RLIM_INFINITY:
+        new_hard = min(new_hard, hard)
+        soft = min(soft, new_hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, new_hard))
+
+
+def _as_script(path):
+    """Make the child look like `python <path>`: argv, sys.path[0] and no server modules"""
+    sys.argv = [path]
+    sys.path[0] = os.path.dirname(path)
+    for name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None)
+        if name != '__main__' and module_file and os.path.dirname(os.path.abspath(module_file)) == SERVER_DIR:
+            del sys.modules[name]
+
+
+def _execute(code, path, cpu_seconds=None):
+    """Run one snippet, saved at path, in the forked child; returns (returncode, limit_exceeded)"""
+    if cpu_seconds:
+        _limit_cpu(cpu_seconds)
+    _as_script(path)
+    try:
+        namespace = {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__}
+        exec(compile(code, path, "exec"), namespace)
+    except CpuLimitExceeded:
+        print(f"CpuLimitExceeded: snippet used more than {cpu_seconds} seconds of CPU time",
+              file=sys.stderr)
+        return 1, "cpu"
+    except MemoryError as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1, "memory"
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0, None
+        print(e.code, file=sys.stderr)
+        return 1, None
+    except BaseException as e:
+        # Hide this frame so the traceback starts at the snippet
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1, None
+    return 0, None
+
+
+def _run_forked(code, cpu_seconds, protocol_fds):
+    """Run a snippet in a child forked from the warm worker and collect its output and usage.
+
+    The child starts with the worker's preloaded modules but nothing it
+    changes (modules, builtins, threads, cwd, environment) outlives it.
+    """
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='snippet-') as workdir, \
+            tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        # A real file, as with `python script.py`: __file__ and tracebacks point at it
+        path = os.path.join(workdir, 'snippet.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        status_read, status_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # Keep the snippet away from the protocol pipes
+                os.close(status_read)
+                for fd in protocol_fds:
+                    os.close(fd)
+                os.dup2(out.fileno(), 1)
+                os.dup2(err.fileno(), 2)
+                returncode, limit_exceeded = _execute(code, path, cpu_seconds)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                # Plain bytes: the snippet may have replaced json (or anything else) in this process
+                os.write(status_write, b'%d %s' % (returncode, (limit_exceeded or '').encode()))
+            finally:
+                os._exit(0)
+
+        os.close(status_write)
+        _, status, rusage = os.wait4(pid, 0)
+        wall_time = time.perf_counter() - started
+        # The child wrote its status before exiting; don't wait on descendants holding the pipe
+        os.set_blocking(status_read, False)
+        try:
+            report = os.read(status_read, 65536)
+        except BlockingIOError:
+            report = b''
+        os.close(status_read)
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode('utf-8', errors='replace')
+        stderr = err.read().decode('utf-8', errors='replace')
+
+    cpu_time = rusage.ru_utime + rusage.ru_stime
+    try:
+        code_field, _, limit_field = report.decode().partition(' ')
+        returncode, limit_exceeded = int(code_field), limit_field or None
+    except ValueError:
+        # Killed before it could report, e.g. by the RLIMIT_CPU hard limit
+        returncode = os.waitstatus_to_exitcode(status)
+        limit_exceeded = None
+        if returncode == -signal.SIGKILL and cpu_seconds and cpu_time >= cpu_seconds:
+            limit_exceeded = "cpu"
+            stderr += f"CpuLimitExceeded: snippet used more than {cpu_seconds} seconds of CPU time\n"
+    usage = {
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "peak_rss": maxrss_bytes(rusage.ru_maxrss),
+        "limit_exceeded": limit_exceeded,
+    }
+    return {"stdout": stdout, "stderr": stderr, "returncode": returncode, "usage": usage}
+
+
+def _worker_main():
+    for name in PRELOAD_MODULES:
+        __import__(name)
+    # Keep the protocol pipes away from the snippet: it gets /dev/null as stdin
+    proto_in = os.fdopen(os.dup(0), 'rb')
+    proto_out = os.fdopen(os.dup(1), 'wb')
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    sys.stdin = open(os.devnull)
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    protocol_fds = (proto_in.fileno(), proto_out.fileno())
+    for line in proto_in:
+        request = json.loads(line)
+        reply = _run_forked(request["code"], request.get("cpu_seconds"), protocol_fds)
+        proto_out.write(json.dumps(reply).encode('utf-8') + b'\n')
+        proto_out.flush()
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['--worker']:
+    _worker_main()
@@ -0,0 +1,355 @@
+import math
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from assertions import ResponseView
+from histogram import LatencyHistogram
+from httpclient import PooledClient
+from streaming import CHUNK_SIZE, MAX_BODY_SIZE, read_limited
+
+# Configuration
+MAX_CONCURRENCY = 100
+MAX_TOTAL_REQUESTS = 100000
+MAX_DURATION = 300  # seconds
+MAX_SYNC_REQUESTS = 1000  # POST /load_test runs inside the request; larger runs go through jobs
+MAX_SYNC_DURATION = 10.0  # seconds
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TOTAL_REQUESTS = 100
+MAX_RUNNING_JOBS = 4
+MAX_FINISHED_JOBS = 50
+PROGRESS_INTERVAL = 1.0  # seconds between streamed progress events
+PROGRESS_HISTORY = 600   # progress events kept per job for late subscribers
+
+# Retries would hide the very errors a load test is meant to surface
+load_client = PooledClient(pool_maxsize=MAX_CONCURRENCY, retries=0)
+
+
+class Pacer:
+    """Spaces out request starts so the whole run stays at a target RPS"""
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Budget:
+    """Hands out request slots until the count or the deadline runs out"""
+
+    def __init__(self, total_requests=None, duration=None, stop_event=None):
+        self.remaining = total_requests
+        self.deadline = time.monotonic() + duration if duration else None
+        self.stop_event = stop_event
+        self.lock = threading.Lock()
+
+    def take(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            return False
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return False
+        if self.remaining is None:
+            return True
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class LoadTestStats:
+    """Collects per-request outcomes from all worker threads.
+
+    Latencies go into fixed-bucket histograms, so memory stays bounded
+    however many requests a run sends.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = LatencyHistogram()
+        self.window = LatencyHistogram()
+        self.window_errors = 0
+        self.status_codes = Counter()
+        self.errors = Counter()
+        self.assertions_passed = 0
+        self.assertions_failed = 0
+        self.assertion_failures = Counter()
+
+    def record(self, latency, status_code=None, error=None, verdict=None):
+        self.latency.record(latency)
+        with self.lock:
+            self.window.record(latency)
+            if verdict is not None:
+                if verdict["passed"]:
+                    self.assertions_passed += 1
+                else:
+                    self.assertions_failed += 1
+                    for result in verdict["results"]:
+                        if not result["passed"]:
+                            self.assertion_failures[result["name"]] += 1
+            if status_code is not None:
+                self.status_codes[status_code] += 1
+            if error is not None:
+                self.errors[error] += 1
+                self.window_errors += 1
+
+    def tick(self):
+        """Return the latency and errors seen since the previous tick"""
+        with self.lock:
+            window, errors = self.window, self.window_errors
+            self.window, self.window_errors = LatencyHistogram(), 0
+        interval = window.summary()
+        interval["errors"] = errors
+        interval["buckets"] = [[bound, n] for bound, n in window.buckets() if bound != math.inf]
+        return interval
+
+    def summary(self, elapsed):
+        latency = self.latency.summary()
+        total = latency.pop("count")
+        with self.lock:
+            failed = sum(self.errors.values())
+            summary = {
+                "total_requests": total,
+                "successful_requests": total - failed,
+                "failed_requests": failed,
+                "errors": dict(self.errors),
+                "status_codes": {str(code): n for code, n in self.status_codes.items()},
+                "duration": elapsed,
+                "throughput": total / elapsed if elapsed > 0 else 0.0,
+                "latency": latency,
+            }
+            if self.assertions_passed or self.assertions_failed:
+                summary["assertions"] = {
+                    "passed": self.assertions_passed,
+                    "failed": self.assertions_failed,
+                    "failures": dict(self.assertion_failures),
+                }
+            return summary
+
+
+def parse_headers(headers):
+    """Validate apiHeaders: an object mapping header names to string values"""
+    if headers is None:
+        return {}
+    if not isinstance(headers, dict) or not all(
+            isinstance(name, str) and isinstance(value, str) for name, value in headers.items()):
+        raise ValueError("apiHeaders must be an object of header names to string values")
+    return headers
+
+
+def parse_load_options(data):
+    """Validate the load-shape fields of a load test payload"""
+    concurrency = int(data.get('concurrency') or DEFAULT_CONCURRENCY)
+    total_requests = data.get('totalRequests')
+    duration = data.get('duration')
+    target_rps = data.get('targetRps')
+
+    if not 1 <= concurrency <= MAX_CONCURRENCY:
+        raise ValueError(f"concurrency must be between 1 and {MAX_CONCURRENCY}")
+    if total_requests is None and duration is None:
+        total_requests = DEFAULT_TOTAL_REQUESTS
+    if total_requests is not None:
+        total_requests = int(total_requests)
+        if not 1 <= total_requests <= MAX_TOTAL_REQUESTS:
+            raise ValueError(f"totalRequests must be between 1 and {MAX_TOTAL_REQUESTS}")
+    if duration is not None:
+        duration = float(duration)
+        if not 0 < duration <= MAX_DURATION:
+            raise ValueError(f"duration must be between 0 and {MAX_DURATION} seconds")
+    if target_rps is not None:
+        target_rps = float(target_rps)
+        if target_rps <= 0:
+            raise ValueError("targetRps must be positive")
+
+    return {
+        "concurrency": concurrency,
+        "total_requests": total_requests,
+        "duration": duration,
+        "target_rps": target_rps,
+    }
+
+
+def sync_options(options):
+    """Bound a run made inside the request; raises ValueError for runs that need a job"""
+    total_requests, duration = options["total_requests"], options["duration"]
+    if (total_requests is not None and total_requests > MAX_SYNC_REQUESTS) or (
+            duration is not None and duration > MAX_SYNC_DURATION):
+        raise ValueError(f"Synchronous load tests are limited to {MAX_SYNC_REQUESTS} requests and "
+                         f"{MAX_SYNC_DURATION:g} seconds; start a job with POST /load_test/jobs instead")
+    # A slow target or a low targetRps must not hold the worker past the limit either
+    return dict(options, duration=min(duration or MAX_SYNC_DURATION, MAX_SYNC_DURATION))
+
+
+def send_one(client, stats, method, url, headers, body, assertions=None):
+    """Fire a single request and record its outcome"""
+    start = time.perf_counter()
+    try:
+        client.throttle(url)
+        start = time.perf_counter()
+        response = client.request(method=method, url=url, headers=headers, json=body,
+                                  stream=True, throttle=False)
+        try:
+            # Drain the (capped) body so the connection goes back to the pool
+            content, _ = read_limited(response.iter_content(CHUNK_SIZE), MAX_BODY_SIZE)
+        finally:
+            response.close()
+        latency = time.perf_counter() - start
+        error = f"HTTP {response.status_code}" if response.status_code >= 400 else None
+        verdict = None
+        if assertions:
+            verdict = assertions.evaluate(ResponseView(response.status_code, response.headers, content, latency))
+        stats.record(latency, status_code=response.status_code, error=error, verdict=verdict)
+    except requests.exceptions.RequestException as e:
+        stats.record(time.perf_counter() - start, error=type(e).__name__)
+    except Exception as e:
+        # Anything else would silently end this worker's share of the run
+        stats.record(time.perf_counter() - start, error=f"Unexpected {type(e).__name__}")
+
+
+def run_load_test(method, url, headers=None, body=None, concurrency=DEFAULT_CONCURRENCY,
+                  total_requests=None, duration=None, target_rps=None, client=None,
+                  assertions=None, stats=None, stop_event=None):
+    """Drive the target with `concurrency` workers and summarise the run"""
+    client = client or load_client
+    stats = stats or LoadTestStats()
+    budget = Budget(total_requests, duration, stop_event)
+    pacer = Pacer(target_rps) if target_rps else None
+
+    def worker():
+        while budget.take():
+            if pacer:
+                pacer.wait()
+            send_one(client, stats, method, url, headers, body, assertions)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        workers = [pool.submit(worker) for _ in range(concurrency)]
+    for future in workers:
+        future.result()  # re-raise a failure outside send_one instead of reporting a short run
+    return stats.summary(time.perf_counter() - start)
+
+
+class LoadTestJob:
+    """A load run executing in the background.
+
+    Every PROGRESS_INTERVAL the job appends a progress event with the
+    latency histogram and error count of the last interval. Subscribers
+    follow the events by sequence number, so several browsers can watch
+    the same run and a late subscriber still sees recent history.
+    """
+
+    def __init__(self, spec, options):
+        self.id = uuid.uuid4().hex
+        self.spec = spec
+        self.options = options
+        self.status = "running"
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stats = LoadTestStats()
+        self.stop_event = threading.Event()
+        self.events = deque(maxlen=PROGRESS_HISTORY)
+        self.seq = 0
+        self.changed = threading.Condition()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        threading.Thread(target=self._report, daemon=True).start()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    @property
+    def done(self):
+        return self.status != "running"
+
+    def _publish(self, event, data):
+        with self.changed:
+            self.seq += 1
+            self.events.append((self.seq, event, data))
+            self.changed.notify_all()
+
+    def _run(self):
+        try:
+            self.result = run_load_test(stats=self.stats, stop_event=self.stop_event,
+                                        **self.spec, **self.options)
+            self.status = "cancelled" if self.stop_event.is_set() else "finished"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        self.finished_at = time.time()
+        self.stop_event.set()
+        self._publish("done", self.describe())
+
+    def _report(self):
+        start = time.monotonic()
+        while not self.stop_event.wait(PROGRESS_INTERVAL):
+            interval = self.stats.tick()
+            interval["elapsed"] = time.monotonic() - start
+            interval["total_requests"] = self.stats.latency.total
+            self._publish("progress", interval)
+
+    def wait_events(self, after, timeout):
+        """Return events newer than sequence number `after`, blocking up to `timeout`"""
+        with self.changed:
+            if self.seq <= after:
+                self.changed.wait(timeout)
+            return [e for e in self.events if e[0] > after]
+
+    def describe(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "options": self.options,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRegistry:
+    """Keeps running jobs plus a bounded number of finished ones"""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.max_running = max_running
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def running_count(self):
+        with self.lock:
+            return self._running_count()
+
+    def _running_count(self):
+        return sum(1 for job in self.jobs.values() if not job.done)
+
+    def start(self, spec, options):
+        with self.lock:
+            if self._running_count() >= self.max_running:
+                raise RuntimeError("Too many load tests are already running")
+            job = LoadTestJob(spec, options)
+            self.jobs[job.id] = job
+            finished = [job_id for job_id, j in self.jobs.items() if j.done]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self.jobs[job_id]
+        job.start()
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
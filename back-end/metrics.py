@@ -0,0 +1,93 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+
+# Configuration
+RATE_WINDOW = 10       # seconds covered by the sliding request rate
+RATE_RESOLUTION = 1.0  # width of one rate slot in seconds
+
+# Exponential buckets from 1 ms to ~65 s, matching the log layout of LatencyHistogram
+LATENCY_BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+
+# Total Requests Counter
+request_counter = Counter('flask_requests_total', 'Total requests received')
+
+# Error Counter
+error_counter = Counter('flask_errors_total', 'Total failed requests')
+
+upstream_latency = Histogram(
+    'apichecker_upstream_latency_seconds',
+    'Latency of proxied calls to target APIs',
+    ['host', 'method', 'status_class'],
+    buckets=LATENCY_BUCKETS,
+)
+
+in_flight_requests = Gauge(
+    'apichecker_in_flight_requests',
+    'Requests currently being proxied by /test_api',
+)
+
+running_load_tests = Gauge(
+    'apichecker_running_load_tests',
+    'Background load test jobs currently running',
+)
+
+
+class SlidingWindowRate:
+    """Request rate over the last `window` seconds.
+
+    Counts are kept in a ring of fixed-width slots; recording a hit and
+    reading the rate only touch the slots that expired since the last call,
+    so both are O(1) amortised instead of a scan over every timestamp.
+    """
+
+    def __init__(self, window=RATE_WINDOW, resolution=RATE_RESOLUTION):
+        self.resolution = resolution
+        self.slots = [0] * max(1, int(round(window / resolution)))
+        self.window = len(self.slots) * resolution
+        self.total = 0
+        self.current = int(time.monotonic() / resolution)
+        self.lock = threading.Lock()
+
+    def _advance(self, now):
+        slot = int(now / self.resolution)
+        expired = min(slot - self.current, len(self.slots))
+        for i in range(1, expired + 1):
+            index = (self.current + i) % len(self.slots)
+            self.total -= self.slots[index]
+            self.slots[index] = 0
+        self.current = max(self.current, slot)
+
+    def hit(self, n=1):
+        with self.lock:
+            self._advance(time.monotonic())
+            self.slots[self.current % len(self.slots)] += n
+            self.total += n
+
+    def rate(self):
+        """Average hits per second over the window"""
+        with self.lock:
+            self._advance(time.monotonic())
+            return self.total / self.window
+
+
+def status_class(status_code):
+    """Collapse an HTTP status into a low-cardinality label such as '2xx'"""
+    if status_code is None:
+        return 'error'
+    return f"{status_code // 100}xx"
+
+
+def observe_upstream(url, method, status_code, latency):
+    upstream_latency.labels(
+        host=urlsplit(url).netloc or 'unknown',
+        method=method.upper(),
+        status_class=status_class(status_code),
+    ).observe(latency)
+
+
+def sample_value(metric_name):
+    """Read the current value of a counter through the public registry API"""
+    return int(REGISTRY.get_sample_value(metric_name) or 0)
@@ -0,0 +1,93 @@
+"""Port leases for launched apps.
+
+PortAllocator keeps the configured range as a FIFO free-list, so a lease is
+O(1) and recently released ports go to the back of the line (away from
+sockets still in TIME_WAIT). A lease carries a TTL; a lease nobody renewed
+or released in time is reclaimed, so a crashed launch cannot leak its port.
+Each candidate port is checked with a single bind() before it is handed out,
+which skips ports some other program is using without a connect timeout.
+"""
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+# Configuration
+LEASE_TTL = 60.0  # seconds a lease lives unless renewed
+
+
+class NoCapacity(Exception):
+    """Every port in the range is leased"""
+
+
+def port_is_free(port, host='127.0.0.1'):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        if os.name != 'nt':
+            # Same as the launched server, so leftover TIME_WAIT sockets don't count
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((host, port))
+            return True
+        except OSError:
+            return False
+
+
+class PortAllocator:
+    """Thread-safe leases over the ports in [start, end]"""
+
+    def __init__(self, start, end, ttl=LEASE_TTL):
+        self.start = start
+        self.end = end
+        self.ttl = ttl
+        self.free = deque(range(start, end + 1))
+        self.leases = {}  # port -> expiry (monotonic), or None while held indefinitely
+        self.lock = threading.Lock()
+        self.stats = {"leased": 0, "released": 0, "reclaimed": 0, "busy_skipped": 0}
+
+    def _reclaim(self, now):
+        expired = [port for port, expiry in self.leases.items() if expiry is not None and expiry <= now]
+        for port in expired:
+            del self.leases[port]
+            self.free.append(port)
+        self.stats["reclaimed"] += len(expired)
+
+    def lease(self, ttl=None):
+        """Lease a free port; raises NoCapacity when none is left"""
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            if not self.free:
+                self._reclaim(time.monotonic())
+            # Each port is tried at most once per call
+            for _ in range(len(self.free)):
+                port = self.free.popleft()
+                if port_is_free(port):
+                    self.leases[port] = time.monotonic() + ttl if ttl else None
+                    self.stats["leased"] += 1
+                    return port
+                self.free.append(port)
+                self.stats["busy_skipped"] += 1
+        raise NoCapacity(f"All ports between {self.start} and {self.end} are in use")
+
+    def renew(self, port, ttl=None):
+        """Extend a lease by ttl seconds, or hold it until release() when ttl is 0"""
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            if port not in self.leases:
+                return False
+            self.leases[port] = time.monotonic() + ttl if ttl else None
+            return True
+
+    def release(self, port):
+        with self.lock:
+            if port not in self.leases:
+                return False
+            del self.leases[port]
+            self.free.append(port)
+            self.stats["released"] += 1
+            return True
+
+    def metrics(self):
+        with self.lock:
+            return dict(self.stats, capacity=self.end - self.start + 1,
+                        in_use=len(self.leases), free=len(self.free))
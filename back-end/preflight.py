@@ -0,0 +1,127 @@
+"""Static analysis of submitted code before anything is executed.
+
+analyze() parses the code once and reports what the executor needs to
+know: whether it is a Flask app and which variable holds the app object,
+the modules it imports, the names it references, and the source with the
+app's own entrypoint calls (`app.run(...)`) neutralised. Syntax errors are
+reported here, so they never cost a process. Results are cached per code
+string, so re-running the same snippet skips the parse entirely.
+"""
+import ast
+import traceback
+from functools import lru_cache
+
+# Configuration
+PREFLIGHT_CACHE_SIZE = 512
+
+
+class Analysis:
+    """Result of analyze(); treat as read-only, instances are shared through the cache"""
+
+    def __init__(self, code, syntax_error=None, is_flask_app=False, app_name=None,
+                 imports=frozenset(), names=frozenset(), runnable_code=None):
+        self.code = code
+        self.syntax_error = syntax_error
+        self.is_flask_app = is_flask_app
+        self.app_name = app_name
+        self.imports = imports
+        self.names = names
+        self.runnable_code = runnable_code if runnable_code is not None else code
+
+
+def imported_modules(tree):
+    """Top-level names of every module the code imports"""
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.add(node.module.split('.')[0])
+    return modules
+
+
+def _flask_references(tree):
+    """Names bound to the Flask class and to the flask module"""
+    classes, modules = set(), set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == 'flask':
+            classes.update(alias.asname or alias.name for alias in node.names if alias.name == 'Flask')
+        elif isinstance(node, ast.Import):
+            modules.update(alias.asname or alias.name for alias in node.names if alias.name == 'flask')
+    return classes, modules
+
+
+def _is_flask_call(node, classes, modules):
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id in classes
+    return (isinstance(func, ast.Attribute) and func.attr == 'Flask'
+            and isinstance(func.value, ast.Name) and func.value.id in modules)
+
+
+def _find_app(tree):
+    """Name of the module-level variable holding the Flask app, or None"""
+    classes, modules = _flask_references(tree)
+    if not classes and not modules:
+        return None
+    for node in tree.body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if _is_flask_call(node.value, classes, modules):
+                for target in targets:
+                    if isinstance(target, ast.Name):
+                        return target.id
+    return None
+
+
+def _run_calls(tree, app_name):
+    """Statements of the form `<app>.run(...)`, wherever they are nested"""
+    return [node for node in ast.walk(tree)
+            if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call)
+            and isinstance(node.value.func, ast.Attribute) and node.value.func.attr == 'run'
+            and isinstance(node.value.func.value, ast.Name) and node.value.func.value.id == app_name]
+
+
+def _replace_with_pass(code, statements):
+    """Swap each statement's exact source span for `pass`, keeping every block valid"""
+    # bytes.splitlines() breaks on the same \n, \r and \r\n as the tokenizer
+    lines = code.encode('utf-8').splitlines(keepends=True)
+    # Offsets are UTF-8 byte columns; edit back to front so earlier spans stay valid
+    for node in sorted(statements, key=lambda n: (n.lineno, n.col_offset), reverse=True):
+        first, last = node.lineno - 1, node.end_lineno - 1
+        head = lines[first][:node.col_offset]
+        tail = lines[last][node.end_col_offset:]
+        lines[first:last + 1] = [head + b'pass' + tail]
+    return b''.join(lines).decode('utf-8')
+
+
+def format_syntax_error(error):
+    """The message Python itself would print for the snippet"""
+    error.filename = 'snippet.py'
+    return ''.join(traceback.format_exception_only(type(error), error))
+
+
+@lru_cache(maxsize=PREFLIGHT_CACHE_SIZE)
+def analyze(code):
+    try:
+        tree = ast.parse(code, filename='snippet.py')
+    except (SyntaxError, ValueError) as e:
+        # ValueError: source contains null bytes
+        if not isinstance(e, SyntaxError):
+            e = SyntaxError(str(e))
+        return Analysis(code, syntax_error={
+            "message": format_syntax_error(e),
+            "line": e.lineno,
+            "offset": e.offset,
+        })
+
+    names = frozenset(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+    app_name = _find_app(tree)
+    runnable_code = None
+    if app_name:
+        runnable_code = _replace_with_pass(code, _run_calls(tree, app_name))
+    return Analysis(code, is_flask_app=app_name is not None, app_name=app_name,
+                    imports=frozenset(imported_modules(tree)), names=names,
+                    runnable_code=runnable_code)
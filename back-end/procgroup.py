@@ -0,0 +1,198 @@
+"""Process-group management for launched snippets and apps.
+
+Every child is started as the leader of its own process group (a new
+session on POSIX, CREATE_NEW_PROCESS_GROUP on Windows) so the whole tree it
+spawns can be stopped together: SIGTERM to the group, then SIGKILL after a
+grace period on POSIX, `taskkill /T /F` on Windows.
+
+Launched apps are tracked as LaunchedApp records; a Reaper thread stops
+the ones that were idle for longer than APP_IDLE_TTL or have been running
+for longer than APP_MAX_LIFETIME. Besides gateway traffic and /keepalive,
+an app counts as active while its port has TCP connections, including
+recently closed ones still in TIME_WAIT, so clients talking to the app's
+own URL keep it alive too.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+import psutil
+
+from histogram import LatencyHistogram
+
+# Configuration
+TERMINATE_GRACE = 3.0                                            # seconds between SIGTERM and SIGKILL
+APP_IDLE_TTL = float(os.environ.get('APP_IDLE_TTL', 600))        # seconds without a touch
+APP_MAX_LIFETIME = float(os.environ.get('APP_MAX_LIFETIME', 3600))
+REAP_INTERVAL = 10.0
+LOOPBACK = ('127.0.0.1', '::1', '::ffff:127.0.0.1')  # launched apps only listen here
+
+
+def popen_kwargs():
+    """Popen arguments that make the child lead its own process group"""
+    if os.name == 'nt':
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _signal_group(pgid, sig):
+    try:
+        os.killpg(pgid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def kill_tree(process, grace=TERMINATE_GRACE):
+    """Stop process and everything it spawned; returns once the leader is reaped"""
+    if os.name == 'nt':
+        if process.poll() is None:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+        process.wait()
+        return
+
+    # The leader's pid is the group id; signal the group even if the leader
+    # already exited, since its children may still be running
+    pgid = process.pid
+    if grace and _signal_group(pgid, signal.SIGTERM):
+        try:
+            process.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            pass
+    _signal_group(pgid, signal.SIGKILL)
+    process.wait()
+
+
+def active_ports():
+    """Ports with open or recently closed TCP connections on either end of a local link.
+
+    Connections of this process (the gateway's keep-alive pool) and their
+    other end are left out; gateway traffic touches apps directly.
+    """
+    try:
+        connections = psutil.net_connections(kind='tcp')
+    except (psutil.AccessDenied, OSError):
+        return set()  # e.g. macOS without root; fall back to gateway traffic only
+    own_pid = os.getpid()
+    ours = {conn.laddr for conn in connections if conn.pid == own_pid and conn.laddr}
+    ports = set()
+    for conn in connections:
+        if not conn.laddr or conn.status == psutil.CONN_LISTEN or conn.laddr in ours or conn.raddr in ours:
+            continue
+        ports.add(conn.laddr.port)
+        if conn.raddr and conn.raddr.ip in LOOPBACK:
+            ports.add(conn.raddr.port)
+    return ports
+
+
+class LaunchedApp:
+    """A running app process, the timestamps the reaper looks at and its proxied traffic"""
+
+    def __init__(self, port, process, idle_ttl=APP_IDLE_TTL, max_lifetime=APP_MAX_LIFETIME):
+        self.id = uuid.uuid4().hex[:12]
+        self.port = port
+        self.process = process
+        self.idle_ttl = idle_ttl
+        self.max_lifetime = max_lifetime
+        self.started_at = time.monotonic()
+        self.last_seen = self.started_at
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def record(self, latency, error=False):
+        """Account one proxied request; latency is time to the response headers"""
+        self.latency.record(latency)
+        with self.lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+    def expiry_reason(self, now=None):
+        """Why the app should be reaped now, or None"""
+        now = now or time.monotonic()
+        if self.process.poll() is not None:
+            return "exited"
+        if self.idle_ttl and now - self.last_seen > self.idle_ttl:
+            return "idle"
+        if self.max_lifetime and now - self.started_at > self.max_lifetime:
+            return "lifetime"
+        return None
+
+    def describe(self, now=None):
+        now = now or time.monotonic()
+        expires_in = []
+        if self.idle_ttl:
+            expires_in.append(self.last_seen + self.idle_ttl - now)
+        if self.max_lifetime:
+            expires_in.append(self.started_at + self.max_lifetime - now)
+        return {
+            "id": self.id,
+            "port": self.port,
+            "pid": self.process.pid,
+            "running": self.process.poll() is None,
+            "uptime": now - self.started_at,
+            "idle": now - self.last_seen,
+            "expires_in": max(0.0, min(expires_in)) if expires_in else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency": self.latency.summary(),
+        }
+
+
+class Reaper:
+    """Background thread that calls cleanup(port) for expired apps.
+
+    `apps` returns a snapshot list of LaunchedApp records; `cleanup` must
+    stop the app and release its port; `activity` returns the ports that
+    saw traffic, whose apps are touched before expiry is checked.
+    """
+
+    def __init__(self, apps, cleanup, interval=REAP_INTERVAL, activity=active_ports):
+        self.apps = apps
+        self.cleanup = cleanup
+        self.activity = activity
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reaped = {"exited": 0, "idle": 0, "lifetime": 0}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def reap(self):
+        """One pass over the apps; returns the ports that were cleaned up"""
+        apps = self.apps()
+        busy = self.activity() if apps else set()
+        now = time.monotonic()
+        ports = []
+        for app in apps:
+            if app.port in busy:
+                app.touch()
+            reason = app.expiry_reason(now)
+            if reason:
+                try:
+                    self.cleanup(app.port)
+                except Exception as e:
+                    print(f"Error reaping app on port {app.port}: {e}")
+                    continue
+                self.reaped[reason] += 1
+                ports.append(app.port)
+        return ports
+
+    def _loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.reap()
@@ -0,0 +1,265 @@
+"""Token-bucket rate limiting with pluggable shared storage.
+
+Limits are written like "10 per minute" and stored in one of:
+
+    memory://                  per-process dict (single worker only)
+    sqlite:///path/limits.db   file shared by every worker on one host
+    redis://host:6379/0        shared by every worker on every host
+
+Set RATE_LIMIT_STORAGE to choose the backend. The Redis store accepts any
+client with a redis-py compatible eval(), so fakeredis can stand in for a
+real server locally.
+"""
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+# Configuration
+RATE_LIMIT_STORAGE = os.environ.get('RATE_LIMIT_STORAGE', 'memory://')
+KEY_PREFIX = 'apichecker:ratelimit:'
+MEMORY_SWEEP_INTERVAL = 60  # seconds between evictions of refilled in-memory buckets
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_RATE = re.compile(r"^\s*(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$", re.IGNORECASE)
+
+
+def parse_rate(rate):
+    """'10 per minute' -> (capacity, refill tokens per second)"""
+    match = _RATE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate limit {rate!r}, expected e.g. '10 per minute'")
+    limit, multiple, period = match.groups()
+    seconds = int(multiple or 1) * _PERIODS[period.lower()]
+    if int(limit) == 0 or seconds == 0:
+        raise ValueError(f"Invalid rate limit {rate!r}, the count and period must be non-zero")
+    return int(limit), int(limit) / seconds
+
+
+def _refill(tokens, updated, capacity, refill_rate, now):
+    return min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+
+
+def _verdict(allowed, tokens, capacity, refill_rate, cost):
+    """(allowed, remaining, retry_after seconds)"""
+    retry_after = 0.0 if allowed else (cost - tokens) / refill_rate
+    return allowed, int(tokens), retry_after
+
+
+class MemoryStorage:
+    """Buckets in a process-local dict; limits are per worker.
+
+    A bucket that has refilled completely is the same as no bucket, so those
+    are swept out periodically (the Redis store lets them EXPIRE) and the
+    dict only holds keys seen recently.
+    """
+
+    # consume() never waits on I/O, so coroutines may call it inline
+    blocking = False
+
+    def __init__(self):
+        self.buckets = {}  # key -> (tokens, updated, time the bucket is full again)
+        self.lock = threading.Lock()
+        self.last_sweep = time.monotonic()
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated, _ = self.buckets.get(key, (capacity, now, now))
+            tokens = _refill(tokens, updated, capacity, refill_rate, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / refill_rate)
+            if now - self.last_sweep >= MEMORY_SWEEP_INTERVAL:
+                self.last_sweep = now
+                self.buckets = {k: bucket for k, bucket in self.buckets.items() if bucket[2] > now}
+        return _verdict(allowed, tokens, capacity, refill_rate, cost)
+
+
+class SQLiteStorage:
+    """Buckets in a SQLite file, shared by all processes on one host.
+
+    Each consume() is a single IMMEDIATE transaction, so concurrent workers
+    serialise on the database lock instead of racing on the bucket.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self.local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*(row or (capacity, now)), capacity, refill_rate, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute("INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return _verdict(allowed, tokens, capacity, refill_rate, cost)
+
+
+_REDIS_CONSUME = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStorage:
+    """Buckets in Redis, updated atomically by a Lua script using the server clock"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis  # Only needed when a Redis backend is configured
+        return cls(redis.Redis.from_url(url))
+
+    def consume(self, key, capacity, refill_rate, cost=1):
+        allowed, tokens = self.client.eval(_REDIS_CONSUME, 1, key, capacity, refill_rate, cost)
+        tokens = float(tokens)
+        return _verdict(bool(allowed), tokens, capacity, refill_rate, cost)
+
+
+def storage_from_uri(uri):
+    if uri.startswith('memory://'):
+        return MemoryStorage()
+    if uri.startswith('sqlite:///'):
+        return SQLiteStorage(uri[len('sqlite:///'):])
+    if uri.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStorage.from_url(uri)
+    raise ValueError(f"Unsupported rate limit storage {uri!r}")
+
+
+_default_storage = None
+_default_lock = threading.Lock()
+
+
+def default_storage():
+    """Process-wide storage configured by RATE_LIMIT_STORAGE"""
+    global _default_storage
+    with _default_lock:
+        if _default_storage is None:
+            _default_storage = storage_from_uri(RATE_LIMIT_STORAGE)
+        return _default_storage
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, key, rate, retry_after):
+        super().__init__(f"Rate limit exceeded: {rate}")
+        self.key = key
+        self.rate = rate
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Applies named rates to arbitrary keys against a shared storage"""
+
+    def __init__(self, storage=None, key_func=None):
+        self.storage = storage
+        self.key_func = key_func
+        self.rates = {}
+
+    def _parsed(self, rate):
+        if rate not in self.rates:
+            self.rates[rate] = parse_rate(rate)
+        return self.rates[rate]
+
+    def hit(self, key, rate, cost=1):
+        """Consume tokens for key; raise RateLimitExceeded when the bucket is empty"""
+        capacity, refill_rate = self._parsed(rate)
+        storage = self.storage or default_storage()
+        allowed, remaining, retry_after = storage.consume(KEY_PREFIX + key, capacity, refill_rate, cost)
+        if not allowed:
+            raise RateLimitExceeded(key, rate, retry_after)
+        return remaining
+
+    async def hit_async(self, key, rate, cost=1):
+        """hit() for coroutines; file and network storages run on the default executor"""
+        storage = self.storage or default_storage()
+        if not getattr(storage, 'blocking', True):
+            return self.hit(key, rate, cost)
+        return await asyncio.get_running_loop().run_in_executor(None, self.hit, key, rate, cost)
+
+    def wait(self, key, rate, timeout):
+        """Block until a token for key is available, or re-raise after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.hit(key, rate)
+            except RateLimitExceeded as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                time.sleep(e.retry_after)
+
+    async def wait_async(self, key, rate, timeout):
+        """wait() for coroutines; sleeps on the event loop instead of the thread"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return await self.hit_async(key, rate)
+            except RateLimitExceeded as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    def limit(self, rate):
+        """Flask route decorator, e.g. @limiter.limit("10 per minute")"""
+        from flask import jsonify
+        self._parsed(rate)  # fail at import time on a malformed rate
+
+        def decorator(view):
+            scope = view.__name__
+
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                try:
+                    self.hit(f"{scope}:{self.key_func()}", rate)
+                except RateLimitExceeded as e:
+                    response = jsonify({"error": str(e)})
+                    response.status_code = 429
+                    response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+                    return response
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
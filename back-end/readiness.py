@@ -0,0 +1,90 @@
+import socket
+import threading
+import time
+from collections import deque
+
+# Configuration
+READY_MARKER = '__SNIPPET_READY__'
+READY_TIMEOUT = 15.0          # seconds a launched app gets to start listening
+READY_INITIAL_BACKOFF = 0.02  # first port probe delay in seconds
+READY_MAX_BACKOFF = 0.5
+OUTPUT_TAIL_LINES = 200
+
+
+class OutputWatcher:
+    """Drains a child's combined stdout/stderr on a background thread.
+
+    Keeps only the last OUTPUT_TAIL_LINES lines (for error reports) and sets
+    `ready` when the child prints the readiness marker. Draining also keeps
+    a chatty child from blocking on a full pipe.
+    """
+
+    def __init__(self, stream, marker=READY_MARKER):
+        self.stream = stream
+        self.marker = marker
+        self.ready = threading.Event()
+        self.ready_line = None
+        self.tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        try:
+            for line in self.stream:
+                if not self.ready.is_set() and line.startswith(self.marker):
+                    self.ready_line = line.strip()
+                    self.ready.set()
+                    continue
+                self.tail.append(line)
+        except (OSError, ValueError):
+            pass  # stream closed underneath us during cleanup
+
+    def output(self):
+        return ''.join(self.tail)
+
+
+def reported_port(watcher):
+    """The port from a readiness line like '__SNIPPET_READY__ 6042', or None"""
+    parts = (watcher.ready_line or '').split()
+    if len(parts) == 2 and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+def port_accepts(port, host='127.0.0.1', timeout=0.2):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def wait_until_ready(process, port, watcher=None, timeout=READY_TIMEOUT,
+                     initial_backoff=READY_INITIAL_BACKOFF, max_backoff=READY_MAX_BACKOFF):
+    """Wait for a launched app to accept connections.
+
+    Returns the measured startup time in seconds. Raises RuntimeError if the
+    process exits first and TimeoutError if the deadline passes. Ports are
+    probed with exponential backoff; a readiness line from the child ends
+    the wait immediately. With port=None (an OS-assigned port) only the
+    readiness line counts.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    backoff = initial_backoff
+    while True:
+        if watcher is not None and watcher.ready.is_set():
+            return time.monotonic() - start
+        if process.poll() is not None:
+            raise RuntimeError("process exited during startup")
+        if port is not None and port_accepts(port):
+            return time.monotonic() - start
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"not listening on port {port or '(any)'} after {timeout} seconds")
+        delay = min(backoff, remaining)
+        if watcher is not None:
+            watcher.ready.wait(delay)
+        else:
+            time.sleep(delay)
+        backoff = min(backoff * 2, max_backoff)
@@ -0,0 +1,112 @@
+"""Content-addressed cache of snippet results.
+
+Entries are keyed on sha256(interpreter version, stdin, code) and evicted
+least-recently-used once either the entry count or the total payload size
+goes over its cap; entries older than the TTL are treated as misses.
+Snippets that import modules whose results vary from run to run (time,
+randomness, network, processes) are never cached, nor is code containing
+a `# nocache` comment.
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from preflight import analyze
+
+# Configuration
+RESULT_CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', 1000))
+RESULT_CACHE_BYTES = int(os.environ.get('RESULT_CACHE_MB', 32)) * 1024 * 1024
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 3600))
+NOCACHE_MARKER = '# nocache'
+NONDETERMINISTIC_MODULES = {
+    'random', 'secrets', 'uuid', 'time', 'datetime', 'calendar', 'zoneinfo',
+    'os', 'subprocess', 'threading', 'multiprocessing', 'asyncio', 'concurrent',
+    'socket', 'ssl', 'http', 'urllib', 'requests', 'httpx', 'aiohttp', 'smtplib', 'ftplib',
+    'tempfile', 'shutil', 'glob', 'pathlib', 'sqlite3', 'pymongo', 'psutil',
+    # Reach any of the above without naming it in an import statement
+    'importlib', 'builtins',
+}
+# Builtins that read outside the code, or run code the analysis never sees
+NONDETERMINISTIC_NAMES = {'open', 'input', '__import__', 'exec', 'eval', 'compile'}
+INTERPRETER = f"{sys.implementation.name}-{sys.version}"
+
+
+def cache_key(code, stdin=''):
+    digest = hashlib.sha256()
+    for part in (INTERPRETER, stdin, code):
+        encoded = part.encode('utf-8')
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def is_cacheable(code):
+    """False for code flagged `# nocache` or using time, randomness, I/O or the network"""
+    if NOCACHE_MARKER in code:
+        return False
+    analysis = analyze(code)
+    if analysis.syntax_error:
+        return True  # the error message is as deterministic as it gets
+    if analysis.imports & NONDETERMINISTIC_MODULES:
+        return False
+    return not analysis.names & NONDETERMINISTIC_NAMES
+
+
+class ResultCache:
+    """Thread-safe LRU with an entry cap, a byte cap and a TTL"""
+
+    def __init__(self, max_entries=RESULT_CACHE_ENTRIES, max_bytes=RESULT_CACHE_BYTES,
+                 ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, size, value)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, size, value = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                self._drop(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        """Store a JSON-serialisable value; values larger than the byte cap are skipped"""
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic(), size, value)
+            self.size += size
+            self.stats["stores"] += 1
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def _drop(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self.entries), bytes=self.size,
+                        hit_rate=self.stats["hits"] / lookups if lookups else None)
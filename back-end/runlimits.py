@@ -0,0 +1,301 @@
+"""Per-run resource limits and usage accounting.
+
+On POSIX every launched snippet gets rlimits on CPU time, data size
+(heap and other private writable memory), open files and written file
+size, applied in the child between fork and exec. The memory cap is
+RLIMIT_DATA rather than RLIMIT_AS: every thread reserves address space for
+its stack and malloc arena, so an address-space cap stops a threaded
+server after a dozen threads while it is still using little memory.
+Thread stacks do count towards RLIMIT_DATA, so limits for servers leave
+room for RUN_SERVER_THREADS stacks on top of the memory cap.
+
+When RUN_CGROUP_PARENT names a delegated cgroup v2 directory, each run
+additionally gets its own child cgroup with memory.max, pids.max and
+cpu.max, which caps the whole process tree rather than a single process.
+
+Usage comes from the wait4() rusage of the reaped child (CPU time and peak
+RSS of the child and the descendants it waited for) plus wall-clock time.
+Platforms without the resource module run unlimited and report wall time
+only.
+"""
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from procgroup import kill_tree, popen_kwargs
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Configuration
+RUN_CPU_SECONDS = int(os.environ.get('RUN_CPU_SECONDS', 10))
+RUN_MEMORY_MB = int(os.environ.get('RUN_MEMORY_MB', 512))
+RUN_MAX_OPEN_FILES = int(os.environ.get('RUN_MAX_OPEN_FILES', 256))
+RUN_MAX_FILE_MB = int(os.environ.get('RUN_MAX_FILE_MB', 64))
+RUN_MAX_PROCESSES = int(os.environ.get('RUN_MAX_PROCESSES', 32))  # enforced through the cgroup only
+RUN_SERVER_THREADS = int(os.environ.get('RUN_SERVER_THREADS', 64))  # stacks allowed beyond memory_mb
+RUN_CPU_QUOTA = float(os.environ.get('RUN_CPU_QUOTA', 1.0))       # cores, enforced through the cgroup only
+RUN_CGROUP_PARENT = os.environ.get('RUN_CGROUP_PARENT')           # e.g. /sys/fs/cgroup/snippets
+
+CPU_PERIOD_USEC = 100000
+MB = 1024 * 1024
+DEFAULT_THREAD_STACK = 8 * MB
+
+
+class RunLimits:
+    """Limits for one run; None disables a limit"""
+
+    def __init__(self, cpu_seconds=RUN_CPU_SECONDS, memory_mb=RUN_MEMORY_MB,
+                 open_files=RUN_MAX_OPEN_FILES, file_mb=RUN_MAX_FILE_MB,
+                 processes=RUN_MAX_PROCESSES, cpu_quota=RUN_CPU_QUOTA, threads=0):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.open_files = open_files
+        self.file_mb = file_mb
+        self.processes = processes
+        self.cpu_quota = cpu_quota
+        self.threads = threads
+
+    def rlimits(self):
+        """(resource, (soft, hard)) pairs for setrlimit"""
+        if resource is None:
+            return []
+        limits = []
+        if self.cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL one second later
+            limits.append((resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1)))
+        if self.memory_mb:
+            data = self.memory_mb * MB + self.threads * thread_stack_size()
+            limits.append((resource.RLIMIT_DATA, (data, data)))
+        if self.open_files:
+            limits.append((resource.RLIMIT_NOFILE, (self.open_files,) * 2))
+        if self.file_mb:
+            limits.append((resource.RLIMIT_FSIZE, (self.file_mb * MB,) * 2))
+        return limits
+
+    def apply(self):
+        """Apply the rlimits to the calling process"""
+        for res, (soft, hard) in self.rlimits():
+            _, current_hard = resource.getrlimit(res)
+            if current_hard != resource.RLIM_INFINITY:
+                # An unprivileged process can only lower its hard limit
+                hard = min(hard, current_hard)
+                soft = min(soft, hard)
+            resource.setrlimit(res, (soft, hard))
+
+
+DEFAULT_LIMITS = RunLimits()
+# Launched apps are long-running, threaded servers: no CPU-time cap
+SERVER_LIMITS = RunLimits(cpu_seconds=None, threads=RUN_SERVER_THREADS)
+
+
+def thread_stack_size():
+    """Stack size glibc gives new threads: the RLIMIT_STACK soft limit"""
+    soft, _ = resource.getrlimit(resource.RLIMIT_STACK)
+    return DEFAULT_THREAD_STACK if soft == resource.RLIM_INFINITY else soft
+
+
+class RunCgroup:
+    """A cgroup v2 directory holding exactly one run's process tree"""
+
+    def __init__(self, parent, limits):
+        self.path = os.path.join(parent, f"run-{uuid.uuid4().hex}")
+        os.mkdir(self.path)
+        try:
+            if limits.memory_mb:
+                self._write('memory.max', limits.memory_mb * MB)
+                self._write('memory.swap.max', 0, optional=True)
+            if limits.processes:
+                self._write('pids.max', limits.processes)
+            if limits.cpu_quota:
+                self._write('cpu.max', f"{int(limits.cpu_quota * CPU_PERIOD_USEC)} {CPU_PERIOD_USEC}")
+        except OSError:
+            self.remove()
+            raise
+
+    def _write(self, name, value, optional=False):
+        try:
+            with open(os.path.join(self.path, name), 'w') as f:
+                f.write(str(value))
+        except FileNotFoundError:
+            if not optional:
+                raise
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def enter(self):
+        """Move the calling process into the cgroup (runs in the child before exec)"""
+        self._write('cgroup.procs', os.getpid())
+
+    def usage(self):
+        stats = {}
+        peak = self._read('memory.peak')  # Linux 5.19+
+        if peak:
+            stats["peak_memory"] = int(peak)
+        for name in ('cpu.stat', 'memory.events'):
+            for line in (self._read(name) or '').splitlines():
+                key, _, value = line.partition(' ')
+                if key in ('usage_usec', 'oom_kill'):
+                    stats[key] = int(value)
+        return stats
+
+    def remove(self):
+        # Stragglers (e.g. a daemonised grandchild) are killed with the group
+        self._write('cgroup.kill', 1, optional=True)
+        for _ in range(50):
+            try:
+                os.rmdir(self.path)
+                return
+            except FileNotFoundError:
+                return
+            except OSError:
+                time.sleep(0.01)
+
+
+def create_cgroup(limits, parent=RUN_CGROUP_PARENT):
+    """A cgroup for one run, or None when cgroups are not configured or usable"""
+    if not parent or sys.platform != 'linux':
+        return None
+    try:
+        return RunCgroup(parent, limits)
+    except OSError as e:
+        print(f"cgroup limits unavailable: {e}")
+        return None
+
+
+class MeteredPopen(subprocess.Popen):
+    """Popen that applies RunLimits in the child and records its rusage.
+
+    wait() and poll() (and communicate(), which uses wait()) reap the child
+    with os.wait4() before Popen looks at it, so its CPU time and peak RSS
+    are captured whichever of them collects it. Call finish() after the
+    process has exited to get the usage dict and release the cgroup.
+    """
+
+    def __init__(self, args, limits=DEFAULT_LIMITS, **kwargs):
+        self.limits = limits
+        self.rusage = None
+        self.reap_lock = threading.Lock()
+        self.ended_at = None
+        self.cgroup = create_cgroup(limits) if limits else None
+        if limits and resource is not None:
+            cgroup = self.cgroup
+
+            def setup():
+                if cgroup is not None:
+                    cgroup.enter()
+                limits.apply()
+            kwargs['preexec_fn'] = setup
+        self.started_at = time.monotonic()
+        try:
+            super().__init__(args, **kwargs)
+        except Exception:
+            if self.cgroup is not None:
+                self.cgroup.remove()
+            raise
+
+    def _reap(self, flags):
+        """wait4() the child and set returncode; True once it has been reaped"""
+        if self.returncode is not None:
+            return True
+        if not hasattr(os, 'wait4'):
+            return False
+        # A non-blocking reap gives up while another thread is waiting
+        if not self.reap_lock.acquire(blocking=not flags & os.WNOHANG):
+            return False
+        try:
+            if self.returncode is not None:
+                return True
+            try:
+                pid, status, rusage = os.wait4(self.pid, flags)
+            except ChildProcessError:
+                return False  # reaped elsewhere; Popen sorts out the returncode
+            if pid != self.pid:
+                return False
+            self.rusage = rusage
+            self.ended_at = time.monotonic()
+            self.returncode = os.waitstatus_to_exitcode(status)
+            return True
+        finally:
+            self.reap_lock.release()
+
+    def poll(self):
+        if not hasattr(os, 'wait4'):
+            return super().poll()
+        if not self._reap(os.WNOHANG) and self.reap_lock.locked():
+            return None  # another thread is in wait(); it will collect the status
+        return super().poll()
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            self._reap(0)
+        elif hasattr(os, 'wait4'):
+            deadline = time.monotonic() + timeout
+            delay = 0.0005
+            while not self._reap(os.WNOHANG) and time.monotonic() < deadline:
+                time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                delay = min(delay * 2, 0.05)
+            if self.returncode is None:
+                raise subprocess.TimeoutExpired(self.args, timeout)
+        return super().wait(timeout)
+
+    def finish(self):
+        """Usage of the finished run: wall_time, cpu_time, peak_rss, limit_exceeded"""
+        ended_at = self.ended_at or time.monotonic()
+        usage = {"wall_time": ended_at - self.started_at, "cpu_time": None,
+                 "peak_rss": None, "limit_exceeded": None}
+        if self.rusage is not None:
+            usage["cpu_time"] = self.rusage.ru_utime + self.rusage.ru_stime
+            usage["peak_rss"] = maxrss_bytes(self.rusage.ru_maxrss)
+        if self.cgroup is not None:
+            stats = self.cgroup.usage()
+            self.cgroup.remove()
+            self.cgroup = None
+            if "usage_usec" in stats:
+                usage["cpu_time"] = stats["usage_usec"] / 1e6
+            if "peak_memory" in stats:
+                usage["peak_rss"] = stats["peak_memory"]
+            if stats.get("oom_kill"):
+                usage["limit_exceeded"] = "memory"
+        if self.returncode is not None and self.limits and self.limits.cpu_seconds:
+            # SIGKILL is the hard limit, unless the run was killed for another reason
+            if self.returncode == -getattr(signal, 'SIGXCPU', 0) or (
+                    self.returncode == -getattr(signal, 'SIGKILL', 0)
+                    and (usage["cpu_time"] or 0) >= self.limits.cpu_seconds):
+                usage["limit_exceeded"] = "cpu"
+        return usage
+
+
+def maxrss_bytes(maxrss):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def run_limited(args, timeout, limits=DEFAULT_LIMITS):
+    """subprocess.run() with limits; returns (returncode, stdout, stderr, usage).
+
+    Raises subprocess.TimeoutExpired after killing the process, like
+    subprocess.run().
+    """
+    process = MeteredPopen(args, limits=limits, stdin=subprocess.DEVNULL,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                           **popen_kwargs())
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_tree(process, grace=0)
+        process.communicate()
+        process.finish()
+        raise
+    return process.returncode, stdout, stderr, process.finish()
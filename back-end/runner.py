@@ -0,0 +1,224 @@
+"""Collection runner: execute a JSONL file of /test_api request specs.
+
+Each line is a JSON object using the same fields as the /test_api payload
+(apiMethod, apiURL, apiBody, apiHeaders, apiAssertions) plus an optional
+"id" and an optional "dependsOn" list of ids that must succeed first. Results are
+produced as soon as each request finishes, one JSON object per line.
+
+Usage:
+    python runner.py collection.jsonl -o results.jsonl -c 16
+"""
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from assertions import AssertionSpecError, ResponseView, compile_assertions
+from httpclient import PooledClient
+from streaming import CHUNK_SIZE, MAX_BODY_SIZE, read_limited
+
+# Configuration
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+
+
+def parse_specs(lines):
+    """Lazily turn JSONL lines into request specs, tagging each with its line number"""
+    for line_no, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spec = json.loads(line)
+            if not isinstance(spec, dict):
+                raise ValueError("spec must be a JSON object")
+        except ValueError as e:
+            yield {"line": line_no, "ok": False, "error": f"Invalid spec: {e}"}
+            continue
+        spec["line"] = line_no
+        spec.setdefault("id", str(line_no))
+        spec["id"] = str(spec["id"])
+        yield spec
+
+
+def execute_spec(client, spec):
+    """Send one request spec and describe the outcome"""
+    result = {"id": spec["id"], "line": spec["line"]}
+    if not spec.get('apiMethod') or not spec.get('apiURL'):
+        result.update(ok=False, error="apiMethod and apiURL are required")
+        return result
+    try:
+        assertions = compile_assertions(spec.get('apiAssertions'))
+    except AssertionSpecError as e:
+        result.update(ok=False, error=f"Invalid assertions: {e}")
+        return result
+
+    result["started_at"] = time.time()
+    start = time.perf_counter()
+    try:
+        response = client.request(
+            method=spec['apiMethod'],
+            url=spec['apiURL'],
+            headers=spec.get('apiHeaders', {}),
+            json=spec.get('apiBody') or None,
+            stream=True
+        )
+        try:
+            body, truncated = read_limited(response.iter_content(CHUNK_SIZE), MAX_BODY_SIZE)
+        finally:
+            response.close()
+        latency = time.perf_counter() - start
+        result.update(
+            ok=response.status_code < 400,
+            status_code=response.status_code,
+            response_time=latency,
+            response_size=len(body),
+            truncated=truncated,
+        )
+        if assertions:
+            # Explicit assertions replace the default "status < 400" verdict
+            verdict = assertions.evaluate(ResponseView(response.status_code, response.headers, body, latency))
+            result.update(ok=verdict["passed"], assertions=verdict)
+    except requests.exceptions.RequestException as e:
+        result.update(ok=False, response_time=time.perf_counter() - start,
+                      error=f"Request failed: {str(e)}")
+    except Exception as e:
+        # e.g. malformed apiHeaders; one bad spec must not end the whole collection
+        result.update(ok=False, response_time=time.perf_counter() - start,
+                      error=f"Invalid request: {type(e).__name__}: {e}")
+    return result
+
+
+def skipped(spec, reason):
+    return {"id": spec["id"], "line": spec["line"], "ok": False, "skipped": True, "error": reason}
+
+
+def run_collection(specs, client, concurrency=DEFAULT_CONCURRENCY):
+    """Execute specs concurrently, honouring dependsOn, and yield results as they complete.
+
+    Specs are read from the iterable lazily; at most about 2 * concurrency
+    runnable specs are buffered ahead of the workers.
+    """
+    finished = {}                   # id -> ok
+    blocked = {}                    # id -> (spec, ids still pending)
+    dependents = defaultdict(list)  # id -> ids blocked on it
+    seen = set()                    # every id admitted so far
+    ready = deque()
+    in_flight = {}
+    specs = iter(specs)
+    exhausted = False
+
+    def settle(spec_id, ok):
+        """Record an outcome and release or skip everything waiting on it"""
+        out = []
+        queue = deque([(spec_id, ok)])
+        while queue:
+            done_id, done_ok = queue.popleft()
+            finished[done_id] = done_ok
+            for waiting_id in dependents.pop(done_id, []):
+                if waiting_id not in blocked:
+                    continue
+                spec, pending = blocked[waiting_id]
+                if not done_ok:
+                    del blocked[waiting_id]
+                    out.append(skipped(spec, f"Dependency {done_id} failed"))
+                    queue.append((waiting_id, False))
+                    continue
+                pending.discard(done_id)
+                if not pending:
+                    del blocked[waiting_id]
+                    ready.append(spec)
+        return out
+
+    def admit(spec):
+        if spec["id"] in seen:
+            # A second spec with the same id would overwrite the first one's state
+            return [{"id": spec["id"], "line": spec["line"], "ok": False,
+                     "error": f"Duplicate id {spec['id']}"}]
+        seen.add(spec["id"])
+        depends_on = {str(d) for d in spec.get('dependsOn') or []}
+        failed = [d for d in depends_on if finished.get(d) is False]
+        if failed:
+            return [skipped(spec, f"Dependency {failed[0]} failed")] + settle(spec["id"], False)
+        pending = {d for d in depends_on if d not in finished}
+        if not pending:
+            ready.append(spec)
+            return []
+        blocked[spec["id"]] = (spec, pending)
+        for dep in pending:
+            dependents[dep].append(spec["id"])
+        return []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            while not exhausted and len(ready) + len(in_flight) < 2 * concurrency:
+                try:
+                    spec = next(specs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if "error" in spec and "id" not in spec:
+                    yield spec
+                    continue
+                yield from admit(spec)
+
+            while ready and len(in_flight) < concurrency:
+                spec = ready.popleft()
+                in_flight[pool.submit(execute_spec, client, spec)] = spec
+
+            if not in_flight:
+                if not exhausted:
+                    continue
+                # Whatever is still blocked waits on ids that never ran
+                for spec, pending in list(blocked.values()):
+                    yield skipped(spec, f"Unknown or cyclic dependency: {', '.join(sorted(pending))}")
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                spec = in_flight.pop(future)
+                result = future.result()
+                yield result
+                yield from settle(spec["id"], result["ok"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL collection of API requests")
+    parser.add_argument('collection', help="JSONL file of request specs, or - for stdin")
+    parser.add_argument('-o', '--output', help="Write JSONL results here instead of stdout")
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    concurrency = max(1, min(args.concurrency, MAX_CONCURRENCY))
+    source = sys.stdin if args.collection == '-' else open(args.collection, encoding='utf-8')
+    sink = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    client = PooledClient(pool_maxsize=concurrency, retries=0)
+
+    passed = failed = 0
+    try:
+        for result in run_collection(parse_specs(source), client, concurrency):
+            sink.write(json.dumps(result) + '\n')
+            sink.flush()
+            if result.get("ok"):
+                passed += 1
+            else:
+                failed += 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        client.close()
+
+    print(f"{passed} passed, {failed} failed", file=sys.stderr)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
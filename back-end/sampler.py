@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import deque
+
+import psutil
+
+# Configuration
+SAMPLE_INTERVAL = 1.0   # seconds between samples
+SAMPLE_HISTORY = 300    # samples kept in the ring buffer (5 minutes at 1 s)
+
+
+class SystemSampler:
+    """Samples host and process metrics on a background thread.
+
+    Request handlers read the latest snapshot instead of calling psutil
+    inline, so no introspection syscalls land on the request path and CPU
+    usage is measured over a real interval rather than returning 0.0 on
+    the first call.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=SAMPLE_HISTORY):
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.process = psutil.Process()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Prime the CPU counters so the first real sample covers one interval
+        psutil.cpu_percent(interval=None)
+        self.process.cpu_percent(interval=None)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+                self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        # The counters were primed in __init__; the first sample covers one full interval
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.samples.append(self.sample())
+            except Exception as e:
+                print(f"Error sampling system metrics: {e}")
+
+    def sample(self, cpu=True):
+        """Take a snapshot; with cpu=False the CPU fields are None and the counters are left alone"""
+        with self.process.oneshot():
+            memory = self.process.memory_info()
+            try:
+                open_files = self.process.num_fds()
+            except AttributeError:  # Windows has no file descriptors
+                open_files = self.process.num_handles()
+            process_cpu = self.process.cpu_percent(interval=None) if cpu else None
+            threads = self.process.num_threads()
+        net = psutil.net_io_counters()
+        return {
+            "timestamp": time.time(),
+            "cpu_usage": psutil.cpu_percent(interval=None) if cpu else None,
+            "memory_usage": psutil.virtual_memory().percent,
+            "process_cpu": process_cpu,
+            "process_rss": memory.rss,
+            "open_files": open_files,
+            "threads": threads,
+            "net_bytes_sent": net.bytes_sent if net else None,
+            "net_bytes_recv": net.bytes_recv if net else None,
+        }
+
+    def latest(self):
+        """Most recent snapshot, sampling synchronously only before the first tick.
+
+        Until then there is no measured interval, so the CPU fields are None
+        rather than a misleading 0.0.
+        """
+        try:
+            return self.samples[-1]
+        except IndexError:
+            return self.sample(cpu=False)
+
+    def history(self, seconds=None):
+        samples = list(self.samples)
+        if seconds is not None:
+            cutoff = time.time() - seconds
+            samples = [s for s in samples if s["timestamp"] >= cutoff]
+        return samples
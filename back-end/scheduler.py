@@ -0,0 +1,143 @@
+"""Bounded, fair-share admission for code runs.
+
+At most `max_workers` runs execute at once. Everything else waits in a
+per-client FIFO; when a slot frees up the next client in round-robin order
+is served, so one user clicking Run twenty times cannot starve the others.
+Once `max_queue` runs are waiting, new ones are rejected with QueueFull
+instead of piling more processes onto the host.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from histogram import LatencyHistogram
+
+# Configuration
+MAX_CONCURRENT_RUNS = int(os.environ.get('RUN_MAX_WORKERS', os.cpu_count() or 4))
+MAX_QUEUED_RUNS = int(os.environ.get('RUN_QUEUE_SIZE', 50))
+QUEUE_TIMEOUT = 30  # seconds a queued run waits for a slot before giving up
+
+
+class QueueFull(Exception):
+    """Too many runs are already waiting"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueTimeout(QueueFull):
+    """A queued run did not get a slot in time"""
+
+
+class Slot:
+    """A granted execution slot; release() is idempotent"""
+
+    def __init__(self, scheduler, client, waited):
+        self.scheduler = scheduler
+        self.client = client
+        self.waited = waited
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.scheduler._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Ticket:
+    def __init__(self, client):
+        self.client = client
+        self.granted = threading.Event()
+        self.enqueued_at = time.monotonic()
+
+
+class RunScheduler:
+    """Admits runs up to a concurrency bound with per-client round-robin queues"""
+
+    def __init__(self, max_workers=MAX_CONCURRENT_RUNS, max_queue=MAX_QUEUED_RUNS,
+                 queue_timeout=QUEUE_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.lock = threading.Lock()
+        self.running = 0
+        self.queued = 0
+        self.queues = OrderedDict()  # client -> deque of tickets, in round-robin order
+        self.wait_times = LatencyHistogram()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def acquire(self, client):
+        """Block until a slot is free for client and return it as a Slot.
+
+        Raises QueueFull when the queue is at capacity and QueueTimeout when
+        no slot frees up within queue_timeout seconds.
+        """
+        with self.lock:
+            if self.running < self.max_workers and not self.queued:
+                self.running += 1
+                self.stats["admitted"] += 1
+                self.wait_times.record(0.0)
+                return Slot(self, client, 0.0)
+            if self.queued >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise QueueFull(f"Run queue is full ({self.max_queue} waiting), try again shortly")
+            ticket = _Ticket(client)
+            self.queues.setdefault(client, deque()).append(ticket)
+            self.queued += 1
+            self.stats["queued"] += 1
+
+        if not ticket.granted.wait(self.queue_timeout):
+            with self.lock:
+                # The grant may have raced with the timeout
+                if not ticket.granted.is_set():
+                    self._remove(ticket)
+                    self.stats["timed_out"] += 1
+                    raise QueueTimeout(f"No execution slot became free within {self.queue_timeout} seconds")
+
+        waited = time.monotonic() - ticket.enqueued_at
+        self.wait_times.record(waited)
+        return Slot(self, client, waited)
+
+    def _remove(self, ticket):
+        tickets = self.queues[ticket.client]
+        tickets.remove(ticket)
+        if not tickets:
+            del self.queues[ticket.client]
+        self.queued -= 1
+
+    def _release(self):
+        with self.lock:
+            self.running -= 1
+            if not self.queues:
+                return
+            # Serve the client at the head of the rotation, then move it to the back
+            client, tickets = next(iter(self.queues.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                self.queues.move_to_end(client)
+            else:
+                del self.queues[client]
+            self.queued -= 1
+            self.running += 1
+            self.stats["admitted"] += 1
+            ticket.granted.set()
+
+    def metrics(self):
+        with self.lock:
+            return dict(
+                self.stats,
+                running=self.running,
+                queue_depth=self.queued,
+                waiting_clients=len(self.queues),
+                max_workers=self.max_workers,
+                max_queue=self.max_queue,
+                wait_time=self.wait_times.summary(),
+            )
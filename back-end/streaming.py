@@ -0,0 +1,107 @@
+import json
+
+# Configuration
+MAX_BODY_SIZE = 10 * 1024 * 1024   # bytes buffered from an upstream response
+CHUNK_SIZE = 64 * 1024
+TRUNCATION_MARKER = "\n...[truncated: response exceeded {limit} bytes]"
+
+# Headers that describe the upstream connection rather than the body we relay
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade',
+    'content-length', 'content-encoding',
+}
+
+
+def body_limit(requested):
+    """Per-request body cap, never above MAX_BODY_SIZE"""
+    if requested is None:
+        return MAX_BODY_SIZE
+    requested = int(requested)
+    if requested <= 0:
+        raise ValueError("apiMaxBodySize must be positive")
+    return min(requested, MAX_BODY_SIZE)
+
+
+def read_limited(chunks, limit):
+    """Buffer at most `limit` bytes from an iterator of chunks.
+
+    Returns (body, truncated). Reading stops as soon as the limit is
+    passed, so an oversized response never sits in memory in full.
+    """
+    parts, size = [], 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if size + len(chunk) > limit:
+            parts.append(chunk[:limit - size])
+            return b''.join(parts), True
+        parts.append(chunk)
+        size += len(chunk)
+    return b''.join(parts), False
+
+
+async def aread_limited(chunks, limit):
+    """read_limited for an async iterator of chunks"""
+    parts, size = [], 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if size + len(chunk) > limit:
+            parts.append(chunk[:limit - size])
+            return b''.join(parts), True
+        parts.append(chunk)
+        size += len(chunk)
+    return b''.join(parts), False
+
+
+def decode_body(status_code, headers, body, truncated, limit, encoding=None):
+    """Turn a buffered upstream body into the "data" field of a /test_api response"""
+    if status_code == 204:
+        return None
+    text = body.decode(encoding or 'utf-8', errors='replace')
+    if truncated:
+        # A cut-off document cannot be parsed, so return what arrived as text
+        return text + TRUNCATION_MARKER.format(limit=limit)
+    if headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass  # mislabelled or malformed; the raw text is still worth showing
+    return text
+
+
+def passthrough_headers(headers):
+    return {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+
+
+# RFC 7230 hop-by-hop headers; a transparent proxy drops only these
+PROXY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade',
+}
+
+
+def proxy_headers(items):
+    """Filter (name, value) pairs for forwarding, keeping repeated headers such as Set-Cookie"""
+    items = list(items)
+    dropped = set(PROXY_HOP_HEADERS)
+    for name, value in items:
+        # Connection may name further per-hop headers
+        if name.lower() == 'connection':
+            dropped.update(token.strip().lower() for token in value.split(','))
+    return [(name, value) for name, value in items if name.lower() not in dropped]
+
+
+class SizedStream:
+    """A request body stream with a known length, so it is sent with Content-Length"""
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        return self.stream.read(size)
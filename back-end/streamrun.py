@@ -0,0 +1,152 @@
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+from procgroup import kill_tree, popen_kwargs
+from runlimits import MeteredPopen
+
+# Configuration
+STREAM_RUN_TIMEOUT = 300          # seconds a streamed script may run
+MAX_STREAMED_OUTPUT = 1024 * 1024  # bytes sent to the client before output is dropped
+TAIL_LINES = 50                    # last lines kept for the final event after the cap
+MAX_LINE_LENGTH = 4096
+QUEUE_SIZE = 1000                  # lines buffered between the pipes and the client
+
+
+class StreamingRun:
+    """A script whose stdout/stderr are relayed line by line as they appear.
+
+    Two reader threads push lines into a bounded queue; the consumer turns
+    them into events. Once MAX_STREAMED_OUTPUT bytes have been sent, further
+    lines are dropped (only a rolling tail is kept) so a chatty script can
+    neither flood the browser nor grow server memory.
+    """
+
+    def __init__(self, code, timeout=STREAM_RUN_TIMEOUT):
+        self.id = uuid.uuid4().hex
+        self.timeout = timeout
+        self.lines = queue.Queue(maxsize=QUEUE_SIZE)
+        self.tail = deque(maxlen=TAIL_LINES)
+        self.sent_bytes = 0
+        self.dropped_lines = 0
+        self.cancelled = False
+        self.timed_out = False
+        self.closed = threading.Event()
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
+            self.temp_file = f.name
+            f.write(code)
+
+        self.started_at = time.monotonic()
+        self.process = MeteredPopen(
+            [sys.executable, '-u', self.temp_file],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors='replace',
+            **popen_kwargs()
+        )
+        self.readers = [
+            threading.Thread(target=self._pump, args=(self.process.stdout, 'stdout'), daemon=True),
+            threading.Thread(target=self._pump, args=(self.process.stderr, 'stderr'), daemon=True),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def _pump(self, pipe, name):
+        try:
+            for line in pipe:
+                if not self._offer((name, line[:MAX_LINE_LENGTH])):
+                    return
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._offer((name, None))
+
+    def _offer(self, item):
+        """Queue a line, giving up once nobody will read the queue again"""
+        while not self.closed.is_set():
+            try:
+                self.lines.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def cancel(self):
+        self.cancelled = True
+        self.kill()
+
+    def kill(self):
+        """Stop the script and anything it spawned"""
+        try:
+            kill_tree(self.process, grace=0)
+        except OSError:
+            pass
+
+    def events(self, keepalive=15):
+        """Yield (event, data) pairs until the script exits"""
+        open_pipes = 2
+        deadline = self.started_at + self.timeout
+        last_event = time.monotonic()
+        try:
+            while open_pipes:
+                if not self.timed_out and time.monotonic() > deadline:
+                    self.timed_out = True
+                    self.kill()
+                try:
+                    name, line = self.lines.get(timeout=1)
+                except queue.Empty:
+                    if self.process.poll() is not None:
+                        # The script is gone but something it spawned still holds the pipes
+                        self.kill()
+                    if time.monotonic() - last_event >= keepalive:
+                        last_event = time.monotonic()
+                        yield None, None
+                    continue
+                if line is None:
+                    open_pipes -= 1
+                    continue
+                self.tail.append({"stream": name, "line": line})
+                if self.sent_bytes + len(line) > MAX_STREAMED_OUTPUT:
+                    if not self.dropped_lines:
+                        yield "truncated", {"limit": MAX_STREAMED_OUTPUT}
+                    self.dropped_lines += 1
+                    continue
+                self.sent_bytes += len(line)
+                last_event = time.monotonic()
+                yield "output", {"stream": name, "line": line}
+
+            returncode = self.process.wait()
+            yield "exit", {
+                "returncode": returncode,
+                "success": returncode == 0 and not self.cancelled and not self.timed_out,
+                "cancelled": self.cancelled,
+                "timed_out": self.timed_out,
+                "duration": time.monotonic() - self.started_at,
+                "usage": self.process.finish(),
+                "dropped_lines": self.dropped_lines,
+                "tail": list(self.tail) if self.dropped_lines else [],
+            }
+        finally:
+            # Also reached when the client disconnects mid-stream
+            self.close()
+
+    def close(self):
+        """Kill the script if it is still running and remove its temp file"""
+        # Readers blocked on a full queue must not wait for a consumer that is gone
+        self.closed.set()
+        self.kill()
+        self.process.wait()
+        self.process.finish()  # releases the run's cgroup, if any
+        try:
+            os.unlink(self.temp_file)
+        except OSError:
+            pass
@@ -0,0 +1,59 @@
+"""POST /files/bulk against the mongomock stand-in.
+
+Run from back-end/: python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+os.environ['MONGO_URI'] = 'mongomock://localhost'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CodeLister  # noqa: E402  (needs MONGO_URI set first)
+
+
+class BulkFilesTest(unittest.TestCase):
+    def setUp(self):
+        CodeLister.files_collection.delete_many({})
+        self.client = CodeLister.app.test_client()
+
+    def bulk(self, ops):
+        return self.client.post('/files/bulk', json={'ops': ops})
+
+    def test_create_move_delete_in_one_batch(self):
+        response = self.bulk([
+            {'op': 'create', 'ref': 'src', 'name': 'src', 'type': 'folder'},
+            {'op': 'create', 'ref': 'lib', 'name': 'lib', 'type': 'folder'},
+            {'op': 'create', 'ref': 'main', 'name': 'main.py', 'type': 'file', 'parent_ref': 'src'},
+            {'op': 'create', 'ref': 'old', 'name': 'old.py', 'type': 'file', 'parent_ref': 'lib'},
+            {'op': 'move', 'ref': 'main', 'parent_ref': 'lib'},
+            {'op': 'rename', 'ref': 'main', 'newName': 'app.py'},
+            {'op': 'delete', 'ref': 'src'},
+        ])
+        self.assertEqual(response.status_code, 200, response.get_json())
+        result = response.get_json()
+        self.assertEqual((result['inserted'], result['modified'], result['deleted']), (4, 2, 1))
+
+        created = result['created']
+        items = {str(doc['_id']): doc for doc in CodeLister.files_collection.find()}
+        self.assertEqual(set(items), {created['lib'], created['main'], created['old']})
+        self.assertEqual(items[created['main']]['parent_id'], created['lib'])
+        self.assertEqual(items[created['main']]['name'], 'app.py')
+
+        tombstones = CodeLister.tombstones(CodeLister.files_collection).find({'rev': result['rev']})
+        self.assertEqual({doc['file_id'] for doc in tombstones}, {created['src']})
+
+    def test_delete_earlier_in_batch_takes_the_subtree(self):
+        response = self.bulk([
+            {'op': 'create', 'ref': 'a', 'name': 'a', 'type': 'folder'},
+            {'op': 'create', 'ref': 'b', 'name': 'b', 'type': 'file', 'parent_ref': 'a'},
+            {'op': 'delete', 'ref': 'a'},
+            {'op': 'rename', 'ref': 'b', 'newName': 'c'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['op'], 3)
+        self.assertEqual(CodeLister.files_collection.count_documents({}), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
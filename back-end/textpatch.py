@@ -0,0 +1,102 @@
+"""Apply incremental edits to stored file content.
+
+Two patch formats are accepted:
+
+    edits   [{"start": 10, "end": 14, "text": "new"}, ...]
+            Ranges refer to the base content and may not overlap. Offsets
+            count UTF-16 code units, the same as JavaScript string indices,
+            so an editor can send them without conversion.
+    diff    a unified diff (as produced by `diff -u` / difflib) against the
+            base content; context and removed lines must match exactly.
+"""
+import re
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_LINE = re.compile(r"[^\n]*\n|[^\n]+")
+
+
+class PatchError(ValueError):
+    """The patch is malformed or does not fit the base content"""
+
+
+def apply_edits(text, edits):
+    if not isinstance(edits, list):
+        raise PatchError("edits must be a list")
+    units = text.encode('utf-16-le')
+    length = len(units) // 2
+    spans = []
+    for edit in edits:
+        try:
+            start, end, replacement = int(edit['start']), int(edit['end']), edit.get('text', '')
+        except (KeyError, TypeError, ValueError):
+            raise PatchError(f"Invalid edit {edit!r}, expected start, end and text") from None
+        if not isinstance(replacement, str):
+            raise PatchError(f"Invalid edit {edit!r}, text must be a string")
+        if not 0 <= start <= end <= length:
+            raise PatchError(f"Edit range {start}-{end} is outside the content (length {length})")
+        spans.append((start, end, replacement))
+
+    spans.sort(key=lambda span: (span[0], span[1]))
+    for (_, previous_end, _), (start, _, _) in zip(spans, spans[1:]):
+        if start < previous_end:
+            raise PatchError("Edits overlap")
+
+    # Apply back to front so earlier offsets stay valid
+    for start, end, replacement in reversed(spans):
+        units = units[:start * 2] + replacement.encode('utf-16-le') + units[end * 2:]
+    try:
+        return units.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise PatchError("An edit splits a surrogate pair") from None
+
+
+def apply_unified_diff(text, diff):
+    if not isinstance(diff, str):
+        raise PatchError("diff must be a string")
+    source = _LINE.findall(text)
+    result = []
+    position = 0  # next unconsumed source line
+    lines = _LINE.findall(diff)  # split on \n only, like the content
+    hunks = 0
+    i = 0
+    while i < len(lines):
+        match = _HUNK.match(lines[i])
+        i += 1
+        if not match:
+            continue  # file headers and anything before the first hunk
+        hunks += 1
+        old_start = int(match.group(1))
+        # A zero-length hunk is anchored after the given line rather than at it
+        old_count = 1 if match.group(2) is None else int(match.group(2))
+        start = old_start - 1 if old_count else old_start
+        if start < position:
+            raise PatchError(f"Hunk at line {old_start} overlaps the previous hunk")
+        if start > len(source):
+            raise PatchError(f"Hunk at line {old_start} is past the end of the content")
+        result.extend(source[position:start])
+        position = start
+
+        op = None
+        while i < len(lines) and not lines[i].startswith('@@'):
+            line = lines[i]
+            i += 1
+            if line.startswith('\\'):
+                # "\ No newline at end of file" applies to the line just before it
+                if op == '+' and result[-1].endswith('\n'):
+                    result[-1] = result[-1][:-1]
+                continue
+            op, body = line[:1], line[1:]
+            if op == '+':
+                result.append(body)
+                continue
+            if op not in (' ', '-'):
+                raise PatchError(f"Unexpected diff line {line!r}")
+            if position >= len(source) or source[position].rstrip('\n') != body.rstrip('\n'):
+                raise PatchError(f"Diff does not match the content at line {position + 1}")
+            if op == ' ':
+                result.append(source[position])
+            position += 1
+    if not hunks:
+        raise PatchError("diff contains no @@ hunk")
+    result.extend(source[position:])
+    return ''.join(result)
@@ -176,7 +176,8 @@ const CodeCompiler = () => {
 
             if (response.ok) {
                 setOutput(
-                    `Request URL: ${data.url}\n` +
+                    // The gateway URL counts every request towards keeping the app alive
+                    `Request URL: ${data.gateway_url || data.url}\n` +
                     `Output: ${data.output || 'No output'}\n`
                 );
             } else {
@@ -15,7 +15,7 @@ const Sidebar = ({ onFileClick }) => { // Added onFileClick prop
     const fetchFileSystem = async () => {
       setLoading(true);
       try{
-        const response = await fetch('http://localhost:5260/files');
+        const response = await fetch('http://localhost:5260/files/tree');
         if(response.ok){
           const data = await response.json();
           setFileSystem(data);